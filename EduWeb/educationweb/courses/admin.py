@@ -1,4 +1,6 @@
-from django.contrib import admin
+from datetime import date
+
+from django.contrib import admin, messages
 from django.template.response import TemplateResponse
 from django.utils.safestring import mark_safe
 from django.urls import path
@@ -14,13 +16,21 @@ class CourseAppAdminSite(admin.AdminSite):
             path('course-stats/', self.stats_view)
         ] + super().get_urls()
     def stats_view(self,request):
+        # ?start=&end= (YYYY-MM-DD): chỉ tính lượt bán trong khoảng ngày này
+        try:
+            start, end = [date.fromisoformat(request.GET[p]) if request.GET.get(p) else None
+                          for p in ('start', 'end')]
+        except ValueError:
+            start = end = None
+            messages.error(request, 'start/end phải có dạng YYYY-MM-DD')
+        if start and end and start > end:
+            start = end = None
+            messages.error(request, 'start phải trước hoặc bằng end')
         return TemplateResponse(request,'admin/stats.html',
                                 {
-                                    'stats': dao.count_course_by_cate(),
-                                    'sold':dao.count_course_sold_by_cate(),
-                                    'month':dao.course_sales_by_month(),
-                                    'quarter':dao.course_sales_by_quarter(),
-                                    'year': dao.course_sales_by_year()
+                                    **dao.admin_stats(start, end),
+                                    'start': start,
+                                    'end': end,
                                 })
 
 
@@ -0,0 +1,207 @@
+import bisect
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .models import Course
+from .text import tokenize
+from . import search
+
+logger = logging.getLogger(__name__)
+
+# Mỗi khóa học có 1 mục cho mỗi vị trí bắt đầu từ trong tiêu đề (tối đa MAX_WORDS),
+# để gõ "co ban" vẫn gợi ý được "Lập trình cơ bản"
+MAX_WORDS = 8
+MAX_LIMIT = 20
+SEPARATOR = '\x00'
+
+
+def entries(title, course_id):
+    words = tokenize(title)[:MAX_WORDS]
+    return {' '.join(words[i:]) + SEPARATOR + str(course_id) for i in range(len(words))}
+
+
+def payloads(course_ids=None):
+    # {id: {'id', 'title', 'thumbnail'}} của các khóa học đã publish
+    queryset = Course.objects.filter(publish=True)
+    if course_ids is not None:
+        queryset = queryset.filter(id__in=course_ids)
+    return {course_id: {'id': course_id, 'title': title, 'thumbnail': thumbnail.url if thumbnail else None}
+            for course_id, title, thumbnail in queryset.values_list('id', 'title', 'thumbnail').iterator()}
+
+
+def prefix_key(prefix):
+    return ' '.join(tokenize(prefix))
+
+
+class MemoryPrefixIndex:
+    # Danh sách mục đã sắp xếp trong bộ nhớ của worker, đồng bộ theo nhật ký thay đổi
+    # của search (Course lưu/xóa). Dùng khi không có Redis (dev, test)
+    def __init__(self):
+        self.keys = []
+        self.data = {}
+        self.seq = None
+        self._lock = threading.Lock()
+
+    def complete(self, prefix, limit):
+        prefix = prefix_key(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            self.sync()
+            start = bisect.bisect_left(self.keys, prefix)
+            ids = []
+            for key in self.keys[start:]:
+                if not key.startswith(prefix) or len(ids) >= limit:
+                    break
+                course_id = int(key.rsplit(SEPARATOR, 1)[1])
+                if course_id not in ids:
+                    ids.append(course_id)
+            return [self.data[i] for i in ids]
+
+    def refresh(self, course_ids):
+        # Worker hiện tại cập nhật ngay, các worker khác cập nhật khi sync
+        with self._lock:
+            self.sync()
+
+    def sync(self):
+        seq, course_ids = search.changes_since(self.seq)
+        if course_ids is None:
+            self.data = payloads()
+            self.keys = sorted(k for i, p in self.data.items() for k in entries(p['title'], i))
+        elif course_ids:
+            for course_id in course_ids:
+                old = self.data.pop(course_id, None)
+                for key in entries(old['title'], course_id) if old else ():
+                    del self.keys[bisect.bisect_left(self.keys, key)]
+            for course_id, payload in payloads(course_ids).items():
+                self.data[course_id] = payload
+                for key in entries(payload['title'], course_id):
+                    bisect.insort(self.keys, key)
+        self.seq = seq
+
+
+class RedisPrefixIndex:
+    # Sorted set (cùng điểm 0, sắp theo thứ tự từ điển) + ZRANGEBYLEX, dùng chung cho mọi worker.
+    # Thông tin trả về (id, title, thumbnail) lưu ở hash DATA_KEY
+    INDEX_KEY = 'autocomplete:index'
+    DATA_KEY = 'autocomplete:data'
+    READY_KEY = 'autocomplete:ready'
+    # Chỉ 1 worker build lại index (SET NX), build vào key tạm rồi RENAME
+    BUILD_KEY = 'autocomplete:building'
+    BUILD_TIMEOUT = 10 * 60
+    BUILD_SUFFIX = ':build'
+
+    def __init__(self):
+        self._redis = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            from django_redis import get_redis_connection
+            self._redis = get_redis_connection('default')
+        return self._redis
+
+    def complete(self, prefix, limit):
+        prefix = prefix_key(prefix)
+        if not prefix:
+            return []
+        if not self.redis.exists(self.READY_KEY):
+            # Chưa có index (lần đầu, Redis bị xóa): build ở thread nền, không quét DB trên request
+            self.start_rebuild()
+            return []
+        start = prefix.encode()
+        keys = self.redis.zrangebylex(self.INDEX_KEY, b'[' + start, b'[' + start + b'\xff', 0, limit * MAX_WORDS)
+        ids = []
+        for key in keys:
+            course_id = key.rsplit(SEPARATOR.encode(), 1)[1]
+            if course_id not in ids:
+                ids.append(course_id)
+                if len(ids) == limit:
+                    break
+        if not ids:
+            return []
+        return [json.loads(p) for p in self.redis.hmget(self.DATA_KEY, ids) if p is not None]
+
+    def refresh(self, course_ids):
+        if not self.redis.exists(self.READY_KEY):
+            return
+        old = self.redis.hmget(self.DATA_KEY, list(course_ids))
+        new = payloads(course_ids)
+        pipe = self.redis.pipeline()
+        for course_id, payload in zip(course_ids, old):
+            if payload is not None:
+                keys = entries(json.loads(payload)['title'], course_id)
+                if keys:
+                    pipe.zrem(self.INDEX_KEY, *keys)
+                pipe.hdel(self.DATA_KEY, course_id)
+        self._add(pipe, new, self.INDEX_KEY, self.DATA_KEY)
+        pipe.execute()
+
+    def start_rebuild(self):
+        # Các worker khác thấy BUILD_KEY thì bỏ qua
+        if self.redis.set(self.BUILD_KEY, 1, nx=True, ex=self.BUILD_TIMEOUT):
+            threading.Thread(target=self._run_rebuild, daemon=True).start()
+
+    def _run_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Autocomplete rebuild failed')
+        finally:
+            self.redis.delete(self.BUILD_KEY)
+            connection.close()
+
+    def rebuild(self):
+        # Đọc seq của nhật ký trước khi đọc dữ liệu: refresh() bỏ qua khi index chưa sẵn sàng,
+        # các thay đổi trong lúc build được áp dụng lại sau khi đổi tên
+        seq, _ = search.changes_since(None)
+        index_key, data_key = self.INDEX_KEY + self.BUILD_SUFFIX, self.DATA_KEY + self.BUILD_SUFFIX
+        self.redis.delete(index_key, data_key)
+        pipe = self.redis.pipeline(transaction=False)
+        self._add(pipe, payloads(), index_key, data_key)
+        pipe.execute()
+
+        # RENAME là atomic: request đọc index cũ hoặc index mới đầy đủ, không có lúc index rỗng
+        built = [self.redis.exists(index_key), self.redis.exists(data_key)]
+        pipe = self.redis.pipeline()
+        for exists, source, target in zip(built, (index_key, data_key), (self.INDEX_KEY, self.DATA_KEY)):
+            if exists:
+                pipe.rename(source, target)
+            else:
+                pipe.delete(target)
+        pipe.set(self.READY_KEY, 1)
+        pipe.execute()
+
+        _, course_ids = search.changes_since(seq)
+        if course_ids:
+            self.refresh(list(course_ids))
+
+    def _add(self, pipe, data, index_key, data_key):
+        for course_id, payload in data.items():
+            keys = entries(payload['title'], course_id)
+            if keys:
+                pipe.zadd(index_key, {key: 0 for key in keys})
+            pipe.hset(data_key, course_id, json.dumps(payload))
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = import_string(settings.COURSE_AUTOCOMPLETE_BACKEND)()
+    return _index
+
+
+def complete(prefix, limit=8):
+    return get_index().complete(prefix, min(limit, MAX_LIMIT))
+
+
+def refresh(course_ids):
+    get_index().refresh(list(course_ids))
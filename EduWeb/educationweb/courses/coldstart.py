@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from scipy import sparse
+
+from .models import Category, Course
+from . import counters, recommender
+from .text import fold
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi danh mục (Category) thay đổi; thay đổi khóa học dùng recommender.SEQ_KEY
+SEQ_KEY = 'coldstart:seq'
+RESULT_KEY = 'recommend:coldstart:{}:{}:{}:{}'
+RESULT_TIMEOUT = 60 * 60
+BATCH_SIZE = 5000
+
+# Trình độ học viên -> (từ khóa trong tiêu đề, từ khóa trong mô tả) của khóa học phù hợp,
+# so khớp không dấu: "co ban" khớp với "cơ bản"
+LEVELS = {
+    fold(level): ([fold(w) for w in title_words], [fold(w) for w in description_words])
+    for level, (title_words, description_words) in {
+        'sinh viên': (['sinh viên'], ['sinh viên']),
+        'học sinh': (['cơ bản'], ['lớp']),
+        'thạc sĩ': (['nâng cao'], ['chuyên sâu']),
+    }.items()
+}
+LEVEL_NAMES = list(LEVELS)
+
+
+def mark_changed():
+    counters.incr(SEQ_KEY)
+
+
+def version():
+    values = cache.get_many([recommender.SEQ_KEY, SEQ_KEY])
+    return values.get(recommender.SEQ_KEY, 0), values.get(SEQ_KEY, 0)
+
+
+def level_of(qualification):
+    # Tên trình độ (vd: 'Sinh viên năm 2') -> vị trí trong LEVEL_NAMES, None nếu không khớp
+    if qualification is None:
+        return None
+    name = fold(qualification.name)
+    for i, level in enumerate(LEVEL_NAMES):
+        if level in name:
+            return i
+    return None
+
+
+class ColdStartModel:
+    # Mỗi khóa học là 1 dòng của ma trận đặc trưng thưa:
+    # [one-hot danh mục | khớp từng trình độ], hồ sơ học viên là vector cùng số cột
+    def __init__(self, ids, features, category_columns, category_ids, version):
+        self.ids = ids
+        self.features = features
+        self.category_columns = category_columns
+        self.category_ids = category_ids
+        self.version = version
+
+    @classmethod
+    def build(cls, version):
+        categories = list(Category.objects.order_by('id').values_list('id', 'title'))
+        category_ids = {cid: i for i, (cid, _) in enumerate(categories)}
+        columns = {title: i for i, (_, title) in enumerate(categories)}
+        ids, features = feature_rows(Course.objects.filter(publish=True), category_ids)
+        return cls(ids, features, columns, category_ids, version)
+
+    def updated(self, course_ids, version):
+        # Chỉ đọc lại các khóa học thay đổi (nhật ký của recommender) thay vì quét lại toàn bộ
+        changed = np.fromiter(course_ids, dtype=np.int64, count=len(course_ids))
+        new_ids, new_features = feature_rows(Course.objects.filter(id__in=course_ids, publish=True),
+                                             self.category_ids)
+        keep = ~np.isin(self.ids, changed)
+        ids = np.concatenate([self.ids[keep], new_ids])
+        features = sparse.vstack([self.features[keep], new_features], format='csr')
+        # Giữ thứ tự theo id: khóa học cùng điểm xếp theo id như khi build lại
+        order = np.argsort(ids, kind='stable')
+        return ColdStartModel(ids[order], features[order], self.category_columns, self.category_ids, version)
+
+    def profile(self, category_titles, level):
+        vector = np.zeros(self.features.shape[1], dtype=np.float32)
+        for title in category_titles:
+            if title in self.category_columns:
+                vector[self.category_columns[title]] = 1
+        if level is not None:
+            vector[self.features.shape[1] - len(LEVEL_NAMES) + level] = 1
+        return vector
+
+    def rank(self, category_titles, level, limit):
+        # 1 phép nhân ma trận-vector; khóa học khớp cả danh mục và trình độ xếp trước
+        scores = self.features @ self.profile(category_titles, level)
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return self.ids[order[scores[order] > 0]].tolist()
+
+
+def feature_rows(queryset, category_ids):
+    # (ids, ma trận đặc trưng) của các khóa học trong queryset, theo thứ tự id
+    n_cat = len(category_ids)
+    ids, rows, cols = [], [], []
+    queryset = queryset.order_by('id').values_list('id', 'category_id', 'title', 'description')
+    for row, (course_id, category_id, title, description) in enumerate(queryset.iterator(chunk_size=BATCH_SIZE)):
+        ids.append(course_id)
+        if category_id in category_ids:
+            rows.append(row)
+            cols.append(category_ids[category_id])
+        title, description = fold(title), fold(description)
+        for i, level in enumerate(LEVEL_NAMES):
+            title_words, description_words = LEVELS[level]
+            if any(w in title for w in title_words) or any(w in description for w in description_words):
+                rows.append(row)
+                cols.append(n_cat + i)
+    features = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                 shape=(len(ids), n_cat + len(LEVEL_NAMES)))
+    return np.array(ids, dtype=np.int64), features
+
+
+class ColdStartRanker:
+    # Model được build 1 lần, sau đó cập nhật ở thread nền (giống collaborative): request dùng model
+    # hiện có trong lúc cập nhật, không quét title/description trên luồng request
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def model(self, current):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = ColdStartModel.build(current)
+        model = self._model
+        if model.version != current:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, args=(current,), daemon=True)
+                    self._worker.start()
+        return model
+
+    def update(self, current):
+        model = self._model
+        seq, course_ids = recommender.changes_since(model.version[0])
+        if model.version[1] != current[1] or course_ids is None:
+            # Danh mục thay đổi (cột one-hot) hoặc thiếu nhật ký: build lại toàn bộ
+            self._model = ColdStartModel.build((seq, current[1]))
+        else:
+            self._model = model.updated(course_ids, (seq, current[1]))
+        return self._model
+
+    def _run(self, current):
+        try:
+            self.update(current)
+        except Exception:
+            logger.exception('Cold-start model update failed')
+        finally:
+            connection.close()
+            with self._lock:
+                self._worker = None
+
+    def recommend(self, interesting_cate, qualification, limit=10):
+        category_titles = sorted({t.strip() for t in (interesting_cate or '').split(',') if t.strip()})
+        level = level_of(qualification)
+        model = self.model(version())
+        # Kết quả chỉ phụ thuộc vào tổ hợp (danh mục quan tâm, trình độ) -> dùng chung cho mọi học viên.
+        # Key theo phiên bản của model đã dùng: kết quả của model cũ (đang cập nhật) không bị lưu dưới phiên bản mới
+        digest = hashlib.md5(','.join(category_titles).encode()).hexdigest()
+        key = RESULT_KEY.format('.'.join(map(str, model.version)), digest, level, limit)
+        ids = cache.get(key)
+        if ids is None:
+            ids = model.rank(category_titles, level, limit)
+            cache.set(key, ids, RESULT_TIMEOUT)
+        return ids
+
+
+ranker = ColdStartRanker()
@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from scipy import sparse
+
+from . import counters
+from .models import Purchase, Rating, UserProgress
+from .similarity import TopKIndex
+
+logger = logging.getLogger(__name__)
+
+# Tăng mỗi khi Purchase/Rating/UserProgress thay đổi, worker so sánh để biết cần tính lại
+SEQ_KEY = 'collaborative:seq'
+BATCH_SIZE = 5000
+
+# Trọng số implicit feedback của từng loại tương tác
+PURCHASE_WEIGHT = 1.0
+RATING_WEIGHT = 1.0 / 5  # rate từ 1 đến 5
+PROGRESS_WEIGHT = 0.5  # đã hoàn thành ít nhất 1 chương của khóa học
+
+
+def mark_changed():
+    counters.incr(SEQ_KEY)
+
+
+def _batches(queryset, size=BATCH_SIZE):
+    # Đọc theo từng batch bằng server-side cursor, mỗi batch chuyển thành mảng numpy
+    batch = []
+    for row in queryset.iterator(chunk_size=size):
+        batch.append(row)
+        if len(batch) == size:
+            yield np.array(batch, dtype=np.int64)
+            batch = []
+    if batch:
+        yield np.array(batch, dtype=np.int64)
+
+
+def interaction_matrix():
+    # Ma trận thưa (học viên x khóa học), các tương tác trùng nhau được cộng dồn
+    students, courses, weights = [], [], []
+    sources = [
+        (Purchase.objects.filter(course__publish=True).values_list('student_id', 'course_id'),
+         lambda batch: np.full(len(batch), PURCHASE_WEIGHT)),
+        (Rating.objects.filter(course__publish=True).values_list('student_id', 'course_id', 'rate'),
+         lambda batch: batch[:, 2] * RATING_WEIGHT),
+        (UserProgress.objects.filter(is_completed=True, chapter__course__publish=True)
+         .values_list('student_id', 'chapter__course_id').order_by().distinct(),
+         lambda batch: np.full(len(batch), PROGRESS_WEIGHT)),
+    ]
+    for queryset, weight in sources:
+        for batch in _batches(queryset):
+            students.append(batch[:, 0])
+            courses.append(batch[:, 1])
+            weights.append(weight(batch).astype(np.float32))
+    if not students:
+        return np.zeros(0, dtype=np.int64), sparse.csr_matrix((0, 0), dtype=np.float32)
+
+    student_ids, rows = np.unique(np.concatenate(students), return_inverse=True)
+    course_ids, cols = np.unique(np.concatenate(courses), return_inverse=True)
+    matrix = sparse.csr_matrix((np.concatenate(weights), (rows, cols)),
+                               shape=(len(student_ids), len(course_ids)))
+    matrix.sum_duplicates()
+    return course_ids, matrix
+
+
+def build_index(k):
+    course_ids, matrix = interaction_matrix()
+    # Vector của mỗi khóa học = cột tương ứng, chuẩn hóa l2 để tích vô hướng = cosine
+    items = matrix.T.tocsr()
+    norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    items = sparse.diags(1 / norms) @ items
+    return TopKIndex.build(course_ids, items.tocsr(), k=k, ann=settings.RECOMMENDER_ANN)
+
+
+class CollaborativeSnapshot:
+    def __init__(self, index, seq):
+        self.index = index
+        self.seq = seq
+
+
+EMPTY = CollaborativeSnapshot(
+    TopKIndex(np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0), dtype=np.float32)),
+    -1)
+
+
+class CollaborativeEngine:
+    # Item-item collaborative filtering, luôn tính lại toàn bộ ở thread nền theo chu kỳ,
+    # request chỉ đọc snapshot hiện có
+    def __init__(self, k=None):
+        self.k = k or settings.RECOMMENDER_TOP_K
+        self._snapshot = EMPTY
+        self._lock = threading.Lock()
+        self._worker = None
+        self._checked_at = None
+
+    @property
+    def snapshot(self):
+        self.ensure_fresh()
+        return self._snapshot
+
+    def neighbors_of(self, course_id):
+        return self.snapshot.index.neighbors_of(course_id)
+
+    def rebuild(self):
+        seq = cache.get(SEQ_KEY, 0)
+        self._snapshot = CollaborativeSnapshot(build_index(self.k), seq)
+        return self._snapshot
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < settings.RECOMMENDER_CF_REFRESH_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            changed = cache.get(SEQ_KEY, 0) != self._snapshot.seq
+        except Exception as ex:
+            logger.warning('Collaborative refresh check failed: %s', ex)
+            return
+        if changed:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Collaborative rebuild failed')
+        finally:
+            connection.close()
+            with self._lock:
+                self._worker = None
+
+
+engine = CollaborativeEngine()
@@ -0,0 +1,76 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import counters
+
+# GET có điều kiện (ETag / Last-Modified -> 304) tính từ các bộ đếm version trong cache,
+# không cần serialize. Bộ đếm mới được khởi tạo bằng thời gian (ms) thay vì 0: nếu cache bị
+# xóa, bộ đếm không quay lại giá trị cũ -> ETag cũ của client không bị trả 304 nhầm
+MODIFIED_KEY = 'modified:{}'
+QUIZ_VERSION_KEY = 'chapter:quiz:version:{}'
+# Bộ đếm khởi tạo khi đọc (trước khi biết đối tượng có tồn tại) có thời hạn: quét id bất kỳ không để lại
+# key vĩnh viễn. Hết hạn -> khởi tạo lại theo thời gian hiện tại (lớn hơn giá trị cũ), chỉ mất 1 lần 304
+SEED_TIMEOUT = 24 * 60 * 60
+
+
+def _seed(key):
+    now = time.time()
+    if cache.add(key, int(now * 1000), timeout=SEED_TIMEOUT):
+        cache.set(MODIFIED_KEY.format(key), now, timeout=SEED_TIMEOUT)
+
+
+def incr(key):
+    now = time.time()
+    value = counters.incr(key, initial=int(now * 1000))
+    cache.set(MODIFIED_KEY.format(key), now, timeout=None)
+    return value
+
+
+def versions(keys):
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        for key in missing:
+            _seed(key)
+        values.update(cache.get_many(missing))
+    return [values.get(key, 0) for key in keys]
+
+
+def last_modified(keys):
+    # Lần tăng bộ đếm gần nhất (update_date là DateField, chỉ chính xác tới ngày).
+    # Thiếu thời điểm của 1 bộ đếm (bị xóa khỏi cache) -> coi như vừa thay đổi
+    modified = cache.get_many([MODIFIED_KEY.format(key) for key in keys])
+    return int(max(modified.get(MODIFIED_KEY.format(key), time.time()) for key in keys))
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(':'.join(str(p) for p in parts).encode()).hexdigest())
+
+
+def not_modified(request, etag, modified=None):
+    # Trả về response 304 nếu client đã có bản mới nhất, ngược lại None
+    return get_conditional_response(request._request, etag=etag, last_modified=modified)
+
+
+def evaluate(request, keys, *parts):
+    # (version của các bộ đếm, etag, last_modified, response 304 hoặc None)
+    current = versions(keys)
+    etag = make_etag(*parts, *current)
+    modified = last_modified(keys)
+    return current, etag, modified, not_modified(request, etag, modified)
+
+
+def set_headers(response, etag, modified=None):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
+
+
+def bump_quiz(chapter_ids):
+    for chapter_id in set(chapter_ids):
+        incr(QUIZ_VERSION_KEY.format(chapter_id))
@@ -0,0 +1,34 @@
+from django.core.cache import cache
+
+# Bộ đếm dùng chung giữa các worker (qua cache) và nhật ký thay đổi đi kèm: mỗi lần publish tăng
+# bộ đếm seq và lưu id các khóa học thay đổi dưới key của seq đó (recommender, search)
+CHANGE_TIMEOUT = 24 * 60 * 60
+
+
+def incr(key, initial=0):
+    # Tăng bộ đếm, khởi tạo bằng initial nếu chưa có (lần đầu, hết hạn hoặc cache bị xóa)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+        return cache.incr(key)
+
+
+def publish(seq_key, change_key, course_ids):
+    seq = incr(seq_key)
+    cache.set(change_key.format(seq), list(course_ids), CHANGE_TIMEOUT)
+    return seq
+
+
+def changes_since(seq_key, change_key, seq):
+    # (seq hiện tại, id các khóa học thay đổi sau seq); None thay cho danh sách id nếu
+    # chưa có dữ liệu (seq None), bộ đếm bị reset hoặc nhật ký đã hết hạn -> cần build lại toàn bộ
+    current = cache.get(seq_key, 0)
+    if seq is None or current < seq:
+        return current, None
+    if current == seq:
+        return current, set()
+    changes = cache.get_many([change_key.format(s) for s in range(seq + 1, current + 1)])
+    if len(changes) != current - seq:
+        return current, None
+    return current, {course_id for ids in changes.values() for course_id in ids}
@@ -0,0 +1,49 @@
+from django.core.cache import cache
+
+from . import conditional
+from .models import Course
+from .serializers import CourseSerializer
+
+# Phần công khai của chi tiết khóa học (chương, giáo viên, bài kiểm tra, danh mục) được cache
+# theo (id, version). Mỗi thay đổi liên quan tăng version -> key cũ không còn được đọc, tự hết hạn
+VERSION_KEY = 'course:version:{}'
+PAYLOAD_KEY = 'course:public:{}:{}'
+PAYLOAD_TIMEOUT = 24 * 60 * 60
+
+# Các trường riêng của từng người dùng, không nằm trong phần được cache
+USER_FIELDS = ('userProgress', 'progress', 'is_purchased')
+
+
+def version(course_id):
+    return conditional.versions([VERSION_KEY.format(course_id)])[0]
+
+
+def bump(course_ids):
+    for course_id in set(course_ids):
+        conditional.incr(VERSION_KEY.format(course_id))
+
+
+def get_public(course_id, current=None):
+    # (version hiện tại, payload hoặc None). Đọc version trước khi serialize: nếu khóa học
+    # thay đổi trong lúc đó, payload cũ được lưu dưới version cũ và không được dùng lại
+    if current is None:
+        current = version(course_id)
+    return current, cache.get(PAYLOAD_KEY.format(course_id, current))
+
+
+def set_public(course_id, current, data):
+    data = {k: v for k, v in data.items() if k not in USER_FIELDS}
+    cache.set(PAYLOAD_KEY.format(course_id, current), data, PAYLOAD_TIMEOUT)
+    return data
+
+
+def public_payload(course_id, request, current=None):
+    # Phần công khai của khóa học từ cache, thiếu thì serialize 1 lần và lưu lại. None nếu không có khóa học
+    current, data = get_public(course_id, current)
+    if data is None:
+        course = Course.objects.select_related('category', 'teacher__user').filter(id=course_id).first()
+        if course is None:
+            return None
+        data = set_public(course_id, current,
+                          CourseSerializer(course, context={'request': request, 'public': True}).data)
+    return data
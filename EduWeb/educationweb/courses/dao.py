@@ -1,7 +1,10 @@
-from django.db.models.functions import TruncMonth, TruncQuarter, TruncYear
+from django.db.models.functions import TruncMonth, TruncQuarter, TruncWeek, TruncYear
 
-from .models import Category, Course, Rating, Purchase, UserProgress
-from django.db.models import Count
+from .models import Category, Course, CourseStats, DailyRevenue, Rating, Purchase, UserProgress
+from .search import search
+from . import response_cache
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.mail import send_mail
 from django.utils.html import strip_tags
@@ -14,7 +17,7 @@ def load_course(params={}):
     q = Course.objects.filter(publish=True)
     kw = params.get('kw')
     if kw:
-        q = q.filter(title__icontains=kw)
+        q = search(q, kw)
 
     cate_id = params.get('cate_id')
     if cate_id:
@@ -24,42 +27,75 @@ def load_course(params={}):
 def count_course_by_cate():
     return Category.objects.annotate(count=Count('course__id')).values("id","title","count").order_by('-count')
 
-def count_course_sold_by_cate():
-    return Category.objects.filter(course__purchase__isnull=False).annotate(
-        count=Count('course__purchase')
-    ).values('id', 'title', 'count').order_by('-count')
-
-def course_sales_by_month():
-    return Purchase.objects.annotate(month=TruncMonth('create_date')).values('month').annotate(count=Count('id')).order_by('month')
-
-def course_sales_by_quarter():
-    return Purchase.objects.annotate(quarter=TruncQuarter('create_date')).values('quarter').annotate(count=Count('id')).order_by('quarter')
-
-def course_sales_by_year():
-    return  Purchase.objects.annotate(year=TruncYear('create_date')).values('year').annotate(count=Count('id')).order_by('year')
+# Số lượt bán theo danh mục / tháng / quý / năm tính trên DailyRevenue (đã gộp theo khóa học, ngày)
+# thay vì quét toàn bộ Purchase. start, end: lọc theo ngày mua (có index theo day)
+def daily_sales(start=None, end=None):
+    rows = DailyRevenue.objects.all()
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    return rows
+
+def count_course_sold_by_cate(start=None, end=None):
+    days = {'course__dailyrevenue__day__gte': start, 'course__dailyrevenue__day__lte': end}
+    return Category.objects.filter(**{k: v for k, v in days.items() if v}).annotate(
+        count=Sum('course__dailyrevenue__sales')
+    ).filter(count__gt=0).values('id', 'title', 'count').order_by('-count')
+
+def course_sales_by_period(trunc, name, start=None, end=None):
+    return daily_sales(start, end).annotate(**{name: trunc('day')}).values(name).annotate(
+        count=Sum('sales')).filter(count__gt=0).order_by(name)
+
+def course_sales_by_month(start=None, end=None):
+    return course_sales_by_period(TruncMonth, 'month', start, end)
+
+def course_sales_by_quarter(start=None, end=None):
+    return course_sales_by_period(TruncQuarter, 'quarter', start, end)
+
+def course_sales_by_year(start=None, end=None):
+    return course_sales_by_period(TruncYear, 'year', start, end)
+
+# Dữ liệu cho trang thống kê của admin, cache theo khoảng ngày và thế hệ của
+# Purchase/Course/Category (signal tăng khi có thay đổi, xem response_cache)
+ADMIN_STATS_TIMEOUT = 10 * 60
+
+def admin_stats(start=None, end=None):
+    generations = response_cache.current_generations([Purchase, Course, Category])
+    key = f'admin:stats:{start}:{end}:' + ':'.join(str(g) for g in generations)
+    stats = cache.get(key)
+    if stats is None:
+        stats = {
+            'stats': list(count_course_by_cate()),
+            'sold': list(count_course_sold_by_cate(start, end)),
+            'month': list(course_sales_by_month(start, end)),
+            'quarter': list(course_sales_by_quarter(start, end)),
+            'year': list(course_sales_by_year(start, end)),
+        }
+        cache.set(key, stats, ADMIN_STATS_TIMEOUT)
+    return stats
 
 
 # teacher function
-def group_by_course(purchases):
-    grouped = {}
-    for purchase in purchases:
-        course_title = purchase.course.title
-        if course_title not in grouped:
-            grouped[course_title] = 0
-        grouped[course_title] += purchase.course.price
-    return grouped
-
-def get_analytics(user_id):
+# Chuỗi doanh thu theo ngày/tuần/tháng, tính trên bảng DailyRevenue
+REVENUE_PERIODS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+
+def teacher_revenue(user_id, start=None, end=None):
+    rows = DailyRevenue.objects.filter(teacher__user_id=user_id)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    return rows
+
+def get_analytics(user_id, start=None, end=None):
     try:
-        purchases = Purchase.objects.filter(
-            course__teacher__user__id=user_id
-        ).select_related('course')
-
-        grouped_earnings = group_by_course(purchases)
-        data = [{'name': course_title, 'total': total} for course_title, total in grouped_earnings.items()]
+        grouped = (teacher_revenue(user_id, start, end).values('course__title')
+                   .annotate(total=Sum('revenue'), sales=Sum('sales')).filter(sales__gt=0).order_by('course__title'))
+        data = [{'name': row['course__title'], 'total': row['total']} for row in grouped]
 
         total_revenue = sum(item['total'] for item in data)
-        total_sales = purchases.count()
+        total_sales = sum(row['sales'] for row in grouped)
         return {
             'data': data,
             'total_revenue': total_revenue,
@@ -71,21 +107,17 @@ def get_analytics(user_id):
             'total_revenue': 0,
             'total_sales': 0,
         }
+
+def revenue_series(user_id, period, start=None, end=None):
+    trunc = REVENUE_PERIODS[period]
+    rows = teacher_revenue(user_id, start, end).annotate(period=trunc('day') if trunc else F('day'))
+    return list(rows.values('period').annotate(total=Sum('revenue'), sales=Sum('sales')).order_by('period'))
 def calculate_review(course):
-    return Rating.objects.filter(course__in=course).count()
+    return CourseStats.objects.filter(course__in=course).aggregate(total=Sum('rating_count'))['total'] or 0
 def calculate_student(course):
-    return Purchase.objects.filter(course__in=course).count()
+    return CourseStats.objects.filter(course__in=course).aggregate(total=Sum('student_count'))['total'] or 0
 def calculate_average_review(course):
-    ratings = Rating.objects.filter(course=course)
-    quantity_rate = ratings.count()
-
-    if quantity_rate > 0:
-        total_rate = sum([r.rate for r in ratings])
-        average_review = total_rate / quantity_rate
-    else:
-        average_review = 0
-
-    return average_review
+    return course.stats.average_rating if hasattr(course, 'stats') else 0
 
 # Google
 
@@ -0,0 +1,95 @@
+import csv
+
+from django.conf import settings
+
+# Xuất danh sách khóa học theo từng đợt (keyset theo id: WHERE id > id cuối đợt trước LIMIT n).
+# Django không dùng server-side cursor với MySQL (.iterator() vẫn nạp hết kết quả vào bộ nhớ),
+# nên đọc theo đợt để bộ nhớ không phụ thuộc số dòng
+CHUNK_SIZE = 5000
+COLUMNS = ['id', 'title', 'category__title', 'price']
+HEADER = COLUMNS + ['link']
+
+
+def course_link(course_id, base_url=None):
+    return f"{base_url or settings.FRONTEND_BASE_URL}/stuwall/course/{course_id}"
+
+
+def batches(queryset, chunk_size=CHUNK_SIZE):
+    # Mỗi đợt là list các tuple theo COLUMNS
+    queryset = queryset.order_by('id').values_list(*COLUMNS)
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+class Echo:
+    # csv.writer ghi vào đây, write() trả lại chuỗi để yield cho StreamingHttpResponse
+    def write(self, value):
+        return value
+
+
+def csv_stream(queryset, chunk_size=CHUNK_SIZE):
+    base_url = settings.FRONTEND_BASE_URL
+    writer = csv.writer(Echo(), lineterminator='\n')
+    yield writer.writerow(HEADER)
+    for rows in batches(queryset, chunk_size):
+        yield ''.join(writer.writerow((*row, course_link(row[0], base_url))) for row in rows)
+
+
+class ChunkSink:
+    # File chỉ ghi cho ParquetWriter: giữ dữ liệu đã ghi đến khi được lấy ra (drain), tự đếm vị trí
+    # vì footer của Parquet cần offset tuyệt đối của các row group
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_stream(queryset, chunk_size=CHUNK_SIZE):
+    # Mỗi đợt là 1 row group; pyarrow là dependency tùy chọn, chỉ import khi dùng
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    base_url = settings.FRONTEND_BASE_URL
+    schema = pa.schema([('id', pa.int64()), ('title', pa.string()), ('category__title', pa.string()),
+                        ('price', pa.int64()), ('link', pa.string())])
+    sink = ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='snappy') as writer:
+        for rows in batches(queryset, chunk_size):
+            ids, titles, categories, prices = zip(*rows)
+            writer.write_table(pa.Table.from_arrays([
+                pa.array(ids, pa.int64()), pa.array(titles, pa.string()), pa.array(categories, pa.string()),
+                pa.array(prices, pa.int64()), pa.array([course_link(i, base_url) for i in ids], pa.string()),
+            ], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,236 @@
+import csv
+import json
+import time
+import uuid
+from collections import defaultdict, deque
+
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+
+from . import autocomplete, recommender, response_cache, search, stats
+from .models import Category, Chapter, Course, QuizAnswer, QuizQuestion, Teacher
+from .text import fold
+
+# Nhập khóa học, chương, câu hỏi quiz từ CSV hoặc JSONL bằng bulk_create theo lô.
+#
+# JSONL: mỗi dòng 1 khóa học, chương và câu hỏi lồng bên trong:
+#   {"title", "description", "category", "teacher", "price", "publish", "thumbnail",
+#    "chapters": [{"title", "description", "video", "is_free",
+#                  "questions": [{"question", "timestamp", "answers": [{"answer", "is_correct"}]}]}]}
+# CSV: mỗi dòng 1 đối tượng, cột type = course | chapter | question.
+#   course: ref, title, description, category, teacher, price, publish, thumbnail
+#   chapter: course (ref của khóa học), ref, title, description, video, is_free
+#   question: chapter (ref của chương), question, timestamp, answers ("A|*B|C", * = đáp án đúng)
+# category là tên danh mục, teacher là username (mặc định lấy giáo viên truyền vào lệnh/API)
+BATCH_SIZE = 1000
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'x')
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def parse_jsonl(lines):
+    # (danh sách khóa học, lỗi), mỗi khóa học giữ số dòng để báo lỗi
+    courses, errors = [], []
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            course = json.loads(line)
+            if not isinstance(course, dict):
+                raise ValueError('mỗi dòng phải là 1 object')
+        except ValueError as ex:
+            errors.append(f'Dòng {line_no}: {ex}')
+            continue
+        course['line'] = line_no
+        courses.append(course)
+    return courses, errors
+
+
+def parse_answers(value):
+    answers = []
+    for answer in (value or '').split('|'):
+        answer = answer.strip()
+        if answer:
+            is_correct = answer.startswith('*')
+            answers.append({'answer': answer.lstrip('*').strip(), 'is_correct': is_correct})
+    return answers
+
+
+def parse_csv(lines):
+    courses, errors = {}, []
+    chapters = {}
+    reader = csv.DictReader(lines)
+    for row in reader:
+        row = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+        kind = row.get('type', '').lower()
+        line_no = reader.line_num
+        if kind == 'course':
+            courses[row.get('ref') or f'line-{line_no}'] = {**row, 'line': line_no, 'chapters': []}
+        elif kind == 'chapter':
+            course = courses.get(row.get('course'))
+            if course is None:
+                errors.append(f'Dòng {line_no}: không có khóa học ref={row.get("course")}')
+                continue
+            chapter = {**row, 'questions': []}
+            course['chapters'].append(chapter)
+            chapters[row.get('ref') or f'line-{line_no}'] = chapter
+        elif kind == 'question':
+            chapter = chapters.get(row.get('chapter'))
+            if chapter is None:
+                errors.append(f'Dòng {line_no}: không có chương ref={row.get("chapter")}')
+                continue
+            chapter['questions'].append({**row, 'answers': parse_answers(row.get('answers'))})
+        else:
+            errors.append(f'Dòng {line_no}: type phải là course, chapter hoặc question')
+    return list(courses.values()), errors
+
+
+def parse(lines, file_format):
+    if file_format == 'csv':
+        return parse_csv(lines)
+    if file_format == 'jsonl':
+        return parse_jsonl(lines)
+    raise ValueError('Định dạng phải là csv hoặc jsonl')
+
+
+def format_of(filename):
+    return filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+
+
+def bulk_insert(model, objs, key_fields, scope_field, batch_size):
+    # bulk_create và gán id cho các đối tượng. MySQL không trả về id sau bulk_create: đọc lại các dòng
+    # theo scope_field (mã import của khóa học, hoặc id của cha vừa tạo trong transaction này -> transaction
+    # khác không thể thêm dòng vào đó) và ghép theo khóa tự nhiên; cùng khóa thì theo thứ tự id, là thứ tự insert
+    if not objs:
+        return
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    if connection.features.can_return_rows_from_bulk_insert:
+        return
+    pending = defaultdict(deque)
+    for obj in objs:
+        pending[tuple(getattr(obj, field) for field in key_fields)].append(obj)
+    scope = sorted({getattr(obj, scope_field) for obj in objs})
+    for start in range(0, len(scope), batch_size):
+        rows = model.objects.filter(**{f'{scope_field}__in': scope[start:start + batch_size]})
+        for row in rows.order_by('id').values_list('id', *key_fields).iterator():
+            queue = pending.get(tuple(row[1:]))
+            if queue:
+                queue.popleft().pk = row[0]
+
+
+def build_course(data, categories, teachers, default_teacher):
+    # (khóa học, các chương, [(câu hỏi, các đáp án)]) chưa lưu, ValueError nếu dữ liệu không hợp lệ
+    title = str(data.get('title') or '').strip()
+    if not title:
+        raise ValueError('thiếu title')
+    category = categories.get(str(data.get('category') or '').strip().lower())
+    if category is None:
+        raise ValueError(f'không có danh mục "{data.get("category")}"')
+    teacher = teachers.get(str(data.get('teacher') or '').strip()) if data.get('teacher') else default_teacher
+    if teacher is None:
+        raise ValueError(f'không có giáo viên "{data.get("teacher") or ""}"')
+    description = data.get('description') or None
+    course = Course(title=title, description=description, category=category, teacher=teacher,
+                    price=int(data.get('price') or 0), publish=to_bool(data.get('publish')),
+                    thumbnail=data.get('thumbnail') or None, search_key=fold(f'{title} {description or ""}'))
+
+    chapters, questions = [], []
+    # Vị trí chương tính trong bộ nhớ (khóa học mới -> bắt đầu từ 1), không cần MAX(position)
+    for position, chapter_data in enumerate(data.get('chapters') or [], 1):
+        chapter_title = str(chapter_data.get('title') or '').strip()
+        if not chapter_title:
+            raise ValueError(f'chương {position} thiếu title')
+        chapter = Chapter(course=course, title=chapter_title, description=chapter_data.get('description') or None,
+                          video=chapter_data.get('video') or None, is_free=to_bool(chapter_data.get('is_free')),
+                          position=position, search_key=fold(chapter_title))
+        chapters.append(chapter)
+        for question_data in chapter_data.get('questions') or []:
+            text = str(question_data.get('question') or '').strip()
+            if not text:
+                raise ValueError(f'chương {position}: câu hỏi thiếu nội dung')
+            question = QuizQuestion(chapter=chapter, question=text, timestamp=float(question_data.get('timestamp') or 0))
+            answers = [QuizAnswer(question=question, answer=str(a.get('answer') or '').strip(),
+                                  is_correct=to_bool(a.get('is_correct')))
+                       for a in question_data.get('answers') or []]
+            questions.append((question, answers))
+    return course, chapters, questions
+
+
+def run_import(courses, default_teacher=None, batch_size=BATCH_SIZE):
+    # Trả về số đối tượng đã tạo, lỗi (khóa học lỗi bị bỏ qua cùng chương/câu hỏi của nó), thời gian
+    started = time.perf_counter()
+    categories = {c.title.lower(): c for c in Category.objects.all()}
+    usernames = {str(c['teacher']).strip() for c in courses if c.get('teacher')}
+    teachers = {t.user.username: t for t in Teacher.objects.filter(user__username__in=usernames).select_related('user')}
+
+    new_courses, chapters, questions, errors = [], [], [], []
+    for data in courses:
+        try:
+            course, course_chapters, course_questions = build_course(data, categories, teachers, default_teacher)
+        except (ValueError, TypeError) as ex:
+            # Khóa học lỗi bị bỏ qua cùng chương, câu hỏi của nó
+            errors.append(f'Dòng {data.get("line", "?")}: {ex}')
+            continue
+        new_courses.append(course)
+        chapters.extend(course_chapters)
+        questions.extend(course_questions)
+
+    token = uuid.uuid4().hex
+    for i, course in enumerate(new_courses):
+        course.import_token = f'{token}:{i}'
+
+    with transaction.atomic():
+        bulk_insert(Course, new_courses, ('import_token',), 'import_token', batch_size)
+        for chapter in chapters:
+            chapter.course_id = chapter.course.id
+        bulk_insert(Chapter, chapters, ('course_id', 'position'), 'course_id', batch_size)
+        for question, _ in questions:
+            question.chapter_id = question.chapter.id
+        bulk_insert(QuizQuestion, [q for q, _ in questions], ('chapter_id', 'question', 'timestamp'), 'chapter_id',
+                    batch_size)
+        answers = []
+        for question, question_answers in questions:
+            for answer in question_answers:
+                answer.question_id = question.id
+                answers.append(answer)
+        bulk_insert(QuizAnswer, answers, ('question_id', 'answer'), 'question_id', batch_size)
+        # Đáp án đúng (đầu tiên) của mỗi câu hỏi: 1 câu UPDATE với subquery cho mỗi lô thay vì CASE WHEN
+        # theo từng câu hỏi của bulk_update
+        corrected = [q.id for q, question_answers in questions if any(a.is_correct for a in question_answers)]
+        first_correct = (QuizAnswer.objects.filter(question=OuterRef('pk'), is_correct=True)
+                         .order_by('id').values('id')[:1])
+        for start in range(0, len(corrected), batch_size):
+            QuizQuestion.objects.filter(id__in=corrected[start:start + batch_size]).update(
+                correct_answer=Subquery(first_correct))
+
+        course_ids = [c.id for c in new_courses]
+        stats.rebuild(course_ids)
+        transaction.on_commit(lambda: after_import(course_ids))
+
+    seconds = time.perf_counter() - started
+    rows = len(new_courses) + len(chapters) + len(questions) + len(answers)
+    return {
+        'courses': len(new_courses),
+        'chapters': len(chapters),
+        'questions': len(questions),
+        'answers': len(answers),
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds else rows,
+    }
+
+
+def after_import(course_ids):
+    # bulk_create không gửi signal: cập nhật gợi ý, tìm kiếm, autocomplete, cache danh sách 1 lần cho cả lô
+    if not course_ids:
+        return
+    recommender.publish_changes(course_ids)
+    recommender.engine.sync(force=True)
+    search.publish_changes(course_ids)
+    autocomplete.refresh(course_ids)
+    for model in (Course, Chapter, QuizQuestion):
+        response_cache.bump(model)
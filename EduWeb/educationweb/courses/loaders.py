@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.db.models import prefetch_related_objects
+
+from .models import Purchase, UserProgress
+
+# Quan hệ cần cho CourseSerializer, nạp 1 lần cho cả trang (không phụ thuộc số khóa học)
+COURSE_RELATIONS = ['category', 'teacher__user', 'chapters', 'exam__questions__answers']
+
+
+class CourseLoader:
+    # Nạp trước dữ liệu cho 1 danh sách khóa học (1 trang) theo từng loại thay vì từng khóa học:
+    # quan hệ (chương, giáo viên, bài kiểm tra...) và dữ liệu riêng của học viên đang đăng nhập
+    # (đã mua, tiến độ). Mỗi request tạo 1 loader, lưu trong context của serializer
+    def __init__(self, courses, user=None):
+        courses = [c for c in courses if c is not None]
+        prefetch_related_objects(courses, *COURSE_RELATIONS)
+        self.load({c.id: [ch.id for ch in c.chapters.all()] for c in courses}, user)
+
+    @classmethod
+    def from_chapters(cls, chapters, user=None):
+        # Chỉ nạp dữ liệu của học viên khi đã biết danh sách chương ({course_id: [chapter_id]}),
+        # vd: phần công khai của khóa học lấy từ cache
+        loader = cls.__new__(cls)
+        loader.load(chapters, user)
+        return loader
+
+    def load(self, chapters, user):
+        self.course_ids = set(chapters)
+        self.total_chapters = {course_id: len(ids) for course_id, ids in chapters.items()}
+        chapter_course = {ch: course_id for course_id, ids in chapters.items() for ch in ids}
+        self.purchased = set()
+        self.completed = {}
+        self.user_progress = defaultdict(list)
+
+        student = getattr(user, 'student', None) if user is not None and user.is_authenticated else None
+        if student is None or not chapters:
+            return
+        self.purchased = set(Purchase.objects.filter(student=student, course_id__in=self.course_ids)
+                             .values_list('course_id', flat=True))
+        if not self.purchased:
+            return
+        chapter_ids = [ch for ch, course_id in chapter_course.items() if course_id in self.purchased]
+        for progress in UserProgress.objects.filter(student=student, chapter_id__in=chapter_ids).order_by('id'):
+            course_id = chapter_course[progress.chapter_id]
+            self.user_progress[course_id].append(progress)
+            if progress.is_completed:
+                self.completed[course_id] = self.completed.get(course_id, 0) + 1
+
+    def __contains__(self, course):
+        return course.id in self.course_ids
+
+    def is_purchased(self, course_id):
+        return course_id in self.purchased
+
+    def progress(self, course_id):
+        # % số chương đã hoàn thành
+        total = self.total_chapters.get(course_id, 0)
+        if total == 0:
+            return 0
+        return (self.completed.get(course_id, 0) / total) * 100
@@ -0,0 +1,72 @@
+import io
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from courses import exports
+from courses.models import Category, Course, Qualification, Teacher, User
+from courses.synthetic import course_titles
+from courses.text import fold
+
+
+class Command(BaseCommand):
+    help = ('Benchmark xuất danh sách khóa học (CSV stream, Parquet, pandas cũ) trên dữ liệu giả lập. '
+            'Tạo thêm khóa học nếu DB chưa đủ --rows, chạy với --settings=educationweb.settings_bench')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+        parser.add_argument('--formats', nargs='+', choices=['csv', 'parquet', 'pandas'], default=['csv', 'parquet'])
+
+    def handle(self, *args, **options):
+        # Có thể thêm hàng triệu khóa học giả lập: chỉ chạy trên file DB benchmark
+        if connection.settings_dict['NAME'] != getattr(settings, 'BENCH_DATABASE', None):
+            raise CommandError('Lệnh này thêm dữ liệu giả lập, chỉ chạy với --settings=educationweb.settings_bench')
+        self.ensure_courses(options['rows'])
+        queryset = Course.objects.filter(publish=True)
+        for name in options['formats']:
+            if name == 'parquet' and not exports.parquet_available():
+                self.stdout.write('parquet: bỏ qua (chưa cài pyarrow)')
+                continue
+            tracemalloc.start()
+            started = time.perf_counter()
+            size = self.run(name, queryset, options['chunk_size'])
+            seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(f'{name}: rows={options["rows"]} time={seconds:.2f}s '
+                              f'rows/s={options["rows"] / seconds:,.0f} size={size / 2 ** 20:.1f}MiB '
+                              f'peak={peak / 2 ** 20:.1f}MiB')
+
+    def run(self, name, queryset, chunk_size):
+        if name == 'csv':
+            return sum(len(chunk) for chunk in exports.csv_stream(queryset, chunk_size))
+        if name == 'parquet':
+            return sum(len(chunk) for chunk in exports.parquet_stream(queryset, chunk_size))
+        # Cách cũ: nạp toàn bộ vào DataFrame rồi ghi vào bộ nhớ
+        import pandas as pd
+        df = pd.DataFrame(queryset.values(*exports.COLUMNS))
+        df['link'] = df['id'].apply(lambda x: f"{settings.FRONTEND_BASE_URL}/stuwall/course/{x}")
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False)
+        return len(buffer.getvalue())
+
+    def ensure_courses(self, rows, batch_size=50000):
+        missing = rows - Course.objects.filter(publish=True).count()
+        if missing <= 0:
+            return
+        qualification, _ = Qualification.objects.get_or_create(name='Sinh viên')
+        user, _ = User.objects.get_or_create(username='bench-export-teacher',
+                                             defaults={'qualification': qualification, 'is_teacher': True})
+        teacher, _ = Teacher.objects.get_or_create(user=user)
+        category, _ = Category.objects.get_or_create(title='Development')
+        titles = course_titles(missing)
+        for start in range(0, missing, batch_size):
+            Course.objects.bulk_create([
+                Course(title=title, teacher=teacher, category=category, publish=True, price=100,
+                       thumbnail='image/upload/sample.jpg', search_key=fold(title))
+                for title in titles[start:start + batch_size]], batch_size=5000)
+        self.stdout.write(f'Đã tạo {missing} khóa học')
@@ -0,0 +1,72 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from courses.similarity import ANN_DEFAULTS, TopKIndex, exact_neighbors
+from courses.synthetic import course_titles
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bộ nhớ, độ trễ p99 và recall (so với kết quả chính xác) của TopKIndex trên dữ liệu giả lập'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000])
+        parser.add_argument('--k', type=int, default=50)
+        parser.add_argument('--queries', type=int, default=10000)
+        parser.add_argument('--modes', nargs='+', choices=['exact', 'ann'], default=['exact'])
+        parser.add_argument('--tables', type=int, default=ANN_DEFAULTS['tables'])
+        parser.add_argument('--bits', type=int, default=ANN_DEFAULTS['bits'])
+        parser.add_argument('--block', type=int, default=ANN_DEFAULTS['block'])
+        parser.add_argument('--recall-sample', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ann = {'tables': options['tables'], 'bits': options['bits'], 'block': options['block'],
+               'seed': ANN_DEFAULTS['seed']}
+        for n in options['sizes']:
+            ids = np.arange(1, n + 1)
+            matrix = TfidfVectorizer(stop_words='english', norm='l2').fit_transform(course_titles(n)).tocsr()
+            # Kết quả chính xác cho 1 mẫu khóa học, dùng để tính recall
+            sample = np.random.default_rng(2).choice(n, size=min(options['recall_sample'], n), replace=False)
+            exact = exact_neighbors(matrix[sample], matrix, ids, options['k'], self_cols=sample)
+            for mode in options['modes']:
+                self.bench(mode, ids, matrix, options['k'], options['queries'],
+                           ann if mode == 'ann' else None, sample, exact)
+
+    def bench(self, mode, ids, matrix, k, queries, ann, sample, exact):
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = TopKIndex.build(ids, matrix, k=k, ann=ann)
+        build_seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rng = np.random.default_rng(1)
+        lookups = rng.choice(ids, size=queries)
+        latencies = np.empty(queries)
+        for i, course_id in enumerate(lookups.tolist()):
+            started = time.perf_counter_ns()
+            index.neighbors_of(course_id)
+            latencies[i] = time.perf_counter_ns() - started
+
+        n = len(ids)
+        self.stdout.write(
+            f'mode={mode} n={n} k={k} build={build_seconds:.2f}s '
+            f'index={index.nbytes / 2 ** 20:.1f}MiB build_peak={peak / 2 ** 20:.1f}MiB '
+            f'dense_equivalent={n * n * 8 / 2 ** 20:.1f}MiB '
+            f'p50={np.percentile(latencies, 50) / 1000:.1f}us p99={np.percentile(latencies, 99) / 1000:.1f}us '
+            f'recall@{k}={recall(index.scores[sample], exact[1]):.3f}'
+        )
+
+
+def recall(scores, exact_scores):
+    # Tính theo điểm thay vì id: các khóa học có cùng điểm với phần tử thứ k đều được tính là đúng
+    counts = (exact_scores > 0).sum(axis=1)
+    rows = counts > 0
+    if not rows.any():
+        return 1.0
+    kth = exact_scores[rows, counts[rows] - 1]
+    hits = (scores[rows] >= kth[:, None] - 1e-6).sum(axis=1)
+    return float(np.mean(np.minimum(hits, counts[rows]) / counts[rows]))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.recommender import RecommenderEngine, save_artifacts
+
+
+class Command(BaseCommand):
+    help = 'Fit TF-IDF và chỉ mục top-k từ Course, lưu artifact để các worker memory-map khi khởi động'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Thư mục artifact (mặc định RECOMMENDER_ARTIFACTS_DIR)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        snapshot = RecommenderEngine().rebuild()
+        path = save_artifacts(snapshot, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {len(snapshot.index)} courses in {time.perf_counter() - started:.2f}s -> {path}'))
@@ -0,0 +1,104 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from courses import collaborative, recommender
+from courses.models import Purchase
+from courses.synthetic import populate
+
+STRATEGIES = {
+    # tên: trọng số collaborative filtering khi trộn với TF-IDF (None -> RECOMMENDER_CF_WEIGHT)
+    'tfidf': 0.0,
+    'collaborative': 1.0,
+    'blend': None,
+}
+
+
+class Command(BaseCommand):
+    help = ('Đánh giá offline các chiến lược gợi ý trên dữ liệu giả lập (SQLite): '
+            'precision@k, recall@k, coverage, độ trễ và bộ nhớ. '
+            'Chạy với --settings=educationweb.settings_bench')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=2000)
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--purchases', type=int, default=6, help='Số lượt mua mỗi học viên')
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES) + ['popular'],
+                            default=list(STRATEGIES) + ['popular'])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # flush xóa toàn bộ dữ liệu: chỉ chạy trên file DB benchmark
+        if connection.settings_dict['NAME'] != getattr(settings, 'BENCH_DATABASE', None):
+            raise CommandError('Lệnh này xóa toàn bộ dữ liệu, chỉ chạy với --settings=educationweb.settings_bench')
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('migrate', verbosity=0)
+
+        started = time.perf_counter()
+        courses, _ = populate(options['courses'], options['students'], options['purchases'], options['seed'])
+        held_out = self.hold_out()
+        self.stdout.write(f'Generated {len(courses)} courses, {Purchase.objects.count()} training purchases, '
+                          f'{len(held_out)} held-out in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        recommender.engine.rebuild()
+        collaborative.engine.rebuild()
+        self.stdout.write(f'Built models in {time.perf_counter() - started:.1f}s')
+
+        history = {}
+        for student_id, course_id in Purchase.objects.order_by('id').values_list('student_id', 'course_id'):
+            history.setdefault(student_id, []).append(course_id)
+        for name in options['strategies']:
+            self.evaluate(name, held_out, history, options['k'], len(courses))
+
+    def hold_out(self):
+        # Giữ lại lượt mua cuối cùng của mỗi học viên (có >= 2 lượt mua) làm đáp án
+        last_ids = (Purchase.objects.values('student_id').annotate(n=Count('id')).filter(n__gte=2)
+                    .order_by().values_list('student_id', flat=True))
+        held_out = {}
+        for student_id in last_ids:
+            purchase = Purchase.objects.filter(student_id=student_id).order_by('-id').first()
+            held_out[student_id] = purchase.course_id
+            purchase.delete()
+        return held_out
+
+    def evaluate(self, name, held_out, history, k, n_courses):
+        if name == 'popular':
+            popular = list(Purchase.objects.values('course_id').annotate(n=Count('id'))
+                           .order_by('-n').values_list('course_id', flat=True)[:k + 50])
+
+        hits, latencies, recommended = 0, [], set()
+        tracemalloc.start()
+        for student_id, target in held_out.items():
+            seen = set(history.get(student_id, []))
+            started = time.perf_counter_ns()
+            if name == 'popular':
+                result = [cid for cid in popular if cid not in seen][:k]
+            else:
+                # Khóa học đang xem = lượt mua gần nhất trong tập huấn luyện
+                ranked = recommender.ranked_neighbors(history[student_id][-1], STRATEGIES[name])
+                result = [] if ranked is None else [cid for cid in ranked.tolist() if cid not in seen][:k]
+            latencies.append(time.perf_counter_ns() - started)
+            hits += target in result
+            recommended.update(result)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        users = max(len(held_out), 1)
+        latencies = np.array(latencies) / 1000
+        self.stdout.write(
+            f'{name:<14} precision@{k}={hits / (users * k):.4f} recall@{k}={hits / users:.4f} '
+            f'coverage={len(recommended) / max(n_courses, 1):.3f} '
+            f'p50={np.percentile(latencies, 50):.1f}us p99={np.percentile(latencies, 99):.1f}us '
+            f'peak_mem={peak / 2 ** 20:.2f}MiB index_mem={self.index_memory() / 2 ** 20:.2f}MiB'
+        )
+
+    def index_memory(self):
+        return recommender.engine.snapshot.index.nbytes + collaborative.engine.snapshot.index.nbytes
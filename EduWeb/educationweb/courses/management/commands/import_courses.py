@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import importer
+from courses.models import Teacher
+
+
+class Command(BaseCommand):
+    help = 'Nhập khóa học, chương, câu hỏi quiz từ file CSV hoặc JSONL (định dạng: xem courses/importer.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'],
+                            help='Mặc định theo đuôi file')
+        parser.add_argument('--teacher', help='Username giáo viên cho các khóa học không có cột teacher')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        teacher = None
+        if options['teacher']:
+            teacher = Teacher.objects.filter(user__username=options['teacher']).first()
+            if teacher is None:
+                raise CommandError(f'Không có giáo viên {options["teacher"]}')
+        file_format = options['file_format'] or importer.format_of(options['path'])
+        with open(options['path'], encoding='utf-8-sig', newline='') as f:
+            try:
+                courses, errors = importer.parse(f, file_format)
+            except ValueError as ex:
+                raise CommandError(str(ex))
+        result = importer.run_import(courses, teacher, options['batch_size'])
+        for error in errors + result['errors']:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["courses"]} khóa học, {result["chapters"]} chương, {result["questions"]} câu hỏi, '
+            f'{result["answers"]} đáp án trong {result["seconds"]}s ({result["rows_per_second"]} dòng/s)'))
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_MODULES = ['educationweb.urls']
+
+
+class Command(BaseCommand):
+    help = ('Đo thời gian import lúc khởi động (python -X importtime) trong 1 process mới, '
+            'báo cáo theo từng package; dùng --budget để phát hiện regression')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES,
+                            help='Các module import sau django.setup() (mặc định: toàn bộ urls/views)')
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Tổng thời gian import tối đa (ms), vượt quá -> lỗi')
+
+    def handle(self, *args, **options):
+        code = 'import django; django.setup(); ' + '; '.join(f'import {m}' for m in options['modules'])
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                capture_output=True, text=True, env=os.environ.copy())
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        # Dòng: "import time:  self [us] | cumulative | imported package"
+        by_package = defaultdict(int)
+        slowest = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            name = name.strip()
+            by_package[name.split('.')[0]] += int(self_us)
+            slowest.append((int(cumulative_us), name))
+        total_ms = sum(by_package.values()) / 1000
+
+        self.stdout.write(f'Total import time: {total_ms:.0f} ms ({len(slowest)} modules)')
+        self.stdout.write('\nBy package (self time):')
+        for package, us in sorted(by_package.items(), key=lambda x: -x[1])[:options['top']]:
+            self.stdout.write(f'  {us / 1000:8.1f} ms  {package}')
+        self.stdout.write('\nSlowest modules (cumulative):')
+        for us, name in sorted(slowest, reverse=True)[:options['top']]:
+            self.stdout.write(f'  {us / 1000:8.1f} ms  {name}')
+
+        if options['budget'] is not None and total_ms > options['budget']:
+            raise CommandError(f'Import time {total_ms:.0f} ms exceeds budget {options["budget"]:.0f} ms')
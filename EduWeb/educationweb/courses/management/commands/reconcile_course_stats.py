@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courses import stats
+
+
+class Command(BaseCommand):
+    help = 'Tính lại CourseStats từ dữ liệu gốc (đánh giá, lượt mua, chương, tiến độ) và sửa các dòng bị lệch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, nargs='+', help='Chỉ tính lại các khóa học này')
+
+    def handle(self, *args, **options):
+        created, updated = stats.rebuild(options['course'])
+        self.stdout.write(self.style.SUCCESS(f'CourseStats: tạo mới {created}, sửa {updated} dòng bị lệch'))
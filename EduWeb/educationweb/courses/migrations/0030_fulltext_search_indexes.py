@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# FULLTEXT index cho courses.search.MySQLFulltextBackend, chỉ tạo trên MySQL
+INDEXES = [
+    ('courses_course', 'course_fulltext', 'title, description'),
+    ('courses_category', 'category_fulltext', 'title'),
+    ('courses_chapter', 'chapter_fulltext', 'title'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name, columns in INDEXES:
+        schema_editor.execute(f'CREATE FULLTEXT INDEX {name} ON {table} ({columns})')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX {name} ON {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0029_qualification_alter_user_qualification'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.7 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+from courses.text import fold
+
+# search_key dùng FULLTEXT với ngram parser (trigram, cần ngram_token_size=3 trên MySQL server)
+OLD_INDEXES = [
+    ('courses_course', 'course_fulltext', 'title, description'),
+    ('courses_chapter', 'chapter_fulltext', 'title'),
+]
+NEW_INDEXES = [
+    ('courses_course', 'course_search_key', 'search_key'),
+    ('courses_chapter', 'chapter_search_key', 'search_key'),
+]
+
+
+def fill_search_keys(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Chapter = apps.get_model('courses', 'Chapter')
+    courses = [Course(id=id, search_key=fold(f'{title} {description or ""}'))
+               for id, title, description in Course.objects.values_list('id', 'title', 'description')]
+    Course.objects.bulk_update(courses, ['search_key'], batch_size=1000)
+    chapters = [Chapter(id=id, search_key=fold(title)) for id, title in Chapter.objects.values_list('id', 'title')]
+    Chapter.objects.bulk_update(chapters, ['search_key'], batch_size=1000)
+
+
+def use_search_key_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name, _ in OLD_INDEXES:
+        schema_editor.execute(f'DROP INDEX {name} ON {table}')
+    for table, name, columns in NEW_INDEXES:
+        schema_editor.execute(f'CREATE FULLTEXT INDEX {name} ON {table} ({columns}) WITH PARSER ngram')
+
+
+def use_title_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table, name, _ in NEW_INDEXES:
+        schema_editor.execute(f'DROP INDEX {name} ON {table}')
+    for table, name, columns in OLD_INDEXES:
+        schema_editor.execute(f'CREATE FULLTEXT INDEX {name} ON {table} ({columns})')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0030_fulltext_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='search_key',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='search_key',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.RunPython(use_search_key_indexes, use_title_indexes),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.7 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+# (model, cột khóa học, điều kiện, {trường: aggregate}) như courses.stats tại thời điểm tạo migration,
+# chép lại để migration không phụ thuộc vào code hiện tại
+SOURCES = [
+    ('Rating', 'course_id', {}, {'rating_sum': Sum('rate'), 'rating_count': Count('id')}),
+    ('Purchase', 'course_id', {}, {'student_count': Count('id')}),
+    ('Chapter', 'course_id', {}, {'chapter_count': Count('id')}),
+    ('UserProgress', 'chapter__course_id', {'is_completed': True}, {'completion_count': Count('id')}),
+]
+
+
+def fill_course_stats(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    CourseStats = apps.get_model('courses', 'CourseStats')
+    stats = {course_id: {} for course_id in Course.objects.values_list('id', flat=True)}
+    for model_name, course_field, filters, aggregates in SOURCES:
+        queryset = apps.get_model('courses', model_name).objects.filter(**filters)
+        for row in queryset.values(course_field).annotate(**aggregates).order_by():
+            course_id = row.pop(course_field)
+            if course_id in stats:
+                stats[course_id].update({field: value or 0 for field, value in row.items()})
+    CourseStats.objects.bulk_create([CourseStats(course_id=course_id, **values) for course_id, values in stats.items()],
+                                    batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0031_search_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.course')),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('student_count', models.IntegerField(default=0)),
+                ('chapter_count', models.IntegerField(default=0)),
+                ('completion_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_course_stats, migrations.RunPython.noop),
+    ]
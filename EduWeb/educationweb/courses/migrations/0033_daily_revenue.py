@@ -0,0 +1,44 @@
+# Generated by Django 5.0.7 on 2026-10-18 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_daily_revenue(apps, schema_editor):
+    # Tính từ Purchase theo giá hiện tại của khóa học (chỉ dùng model lịch sử, không import courses.revenue)
+    DailyRevenue = apps.get_model('courses', 'DailyRevenue')
+    Purchase = apps.get_model('courses', 'Purchase')
+    rows = (Purchase.objects.values('course_id', 'course__teacher_id', 'create_date')
+            .annotate(revenue=Sum('course__price'), sales=Count('id')).order_by())
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(teacher_id=row['course__teacher_id'], course_id=row['course_id'], day=row['create_date'],
+                     revenue=row['revenue'] or 0, sales=row['sales'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0032_course_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('sales', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.course')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.teacher')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['teacher', 'day'], name='courses_dai_teacher_7deb29_idx')],
+                'unique_together': {('teacher', 'course', 'day')},
+            },
+        ),
+        migrations.RunPython(fill_daily_revenue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0033_daily_revenue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyrevenue',
+            index=models.Index(fields=['day'], name='courses_dai_day_df5d53_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+
+def fill_purchase_price(apps, schema_editor):
+    # Giá lúc mua của các Purchase cũ không được lưu: dùng giá hiện tại của khóa học,
+    # rồi tính lại DailyRevenue theo Purchase.price (chỉ dùng model lịch sử, không import courses.revenue)
+    Course = apps.get_model('courses', 'Course')
+    DailyRevenue = apps.get_model('courses', 'DailyRevenue')
+    Purchase = apps.get_model('courses', 'Purchase')
+    Purchase.objects.filter(price__isnull=True).update(
+        price=Subquery(Course.objects.filter(id=OuterRef('course_id')).values('price')[:1]))
+
+    rows = (Purchase.objects.values('course_id', 'course__teacher_id', 'create_date')
+            .annotate(revenue=Sum('price'), sales=Count('id')).order_by())
+    DailyRevenue.objects.all().delete()
+    DailyRevenue.objects.bulk_create([
+        DailyRevenue(teacher_id=row['course__teacher_id'], course_id=row['course_id'], day=row['create_date'],
+                     revenue=row['revenue'] or 0, sales=row['sales'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0034_daily_revenue_day_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='price',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_purchase_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0035_purchase_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='import_token',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
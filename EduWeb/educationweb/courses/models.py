@@ -3,6 +3,7 @@ import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from cloudinary.models import CloudinaryField
+from .text import fold
 
 
 class Qualification(models.Model):
@@ -67,7 +68,16 @@ class Course(Common):
     publish = models.BooleanField(default=False)
     price = models.IntegerField(default=0)
     thumbnail = CloudinaryField('thumbnail',null = True)
+    # Tiêu đề + mô tả đã bỏ dấu, chữ thường (dùng cho tìm kiếm, xem courses/search.py)
+    search_key = models.TextField(default='', editable=False)
+    # Mã duy nhất gán khi nhập hàng loạt (courses/importer.py) để tìm lại id sau bulk_create trên MySQL
+    import_token = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False)
 
+    def save(self, *args, **kwargs):
+        self.search_key = fold(f'{self.title} {self.description or ""}')
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'search_key'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
@@ -88,8 +98,13 @@ class Chapter(Common):
     video = EmbedVideoField(blank=True, null=True)
     position = models.PositiveIntegerField(editable=False)
     is_free = models.BooleanField(default=False)
+    # Tiêu đề đã bỏ dấu, chữ thường
+    search_key = models.TextField(default='', editable=False)
 
     def save(self, *args, **kwargs):
+        self.search_key = fold(self.title)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'search_key'}
         if self.pk is None:
             max_position = Chapter.objects.filter(course=self.course).aggregate(models.Max('position'))['position__max']
             if max_position is None:
@@ -113,9 +128,16 @@ class UserProgress(Time):
 class Purchase(Time):
     student = models.ForeignKey(Student,on_delete=models.CASCADE)
     course = models.ForeignKey(Course,on_delete=models.CASCADE)
+    # Giá khóa học lúc mua (doanh thu tính theo giá này, không đổi khi giáo viên sửa giá)
+    price = models.IntegerField(null=True, blank=True)
     class Meta:
         unique_together = ('student', 'course')
 
+    def save(self, *args, **kwargs):
+        if self.pk is None and self.price is None:
+            self.price = self.course.price
+        super().save(*args, **kwargs)
+
 
 class StripeCustomer(Time):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
@@ -139,6 +161,34 @@ class Comment(Interaction):
     content = models.CharField(max_length=150)
 
 
+# Số liệu tổng hợp của khóa học, cập nhật dần bằng signal (F()), tính lại bằng lệnh reconcile_course_stats
+class CourseStats(models.Model):
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    student_count = models.IntegerField(default=0)
+    chapter_count = models.IntegerField(default=0)
+    # Số lượt hoàn thành chương (UserProgress.is_completed) của tất cả học viên
+    completion_count = models.IntegerField(default=0)
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0
+
+
+# Doanh thu theo ngày của từng khóa học, cộng dồn khi có Purchase mới (xem courses/revenue.py)
+class DailyRevenue(models.Model):
+    teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    day = models.DateField()
+    revenue = models.BigIntegerField(default=0)
+    sales = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('teacher', 'course', 'day')
+        indexes = [models.Index(fields=['teacher', 'day']), models.Index(fields=['day'])]
+
+
 class Note(Time):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE)
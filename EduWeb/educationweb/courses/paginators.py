@@ -1,9 +1,164 @@
+import base64
+import hashlib
+import json
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
-class CoursePaginator(PageNumberPagination):
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import response_cache
+
+# Tổng số dòng được cache theo câu truy vấn + thế hệ (response_cache) của các bảng trong truy vấn,
+# các trang sau không phải COUNT(*) lại. Thêm/xóa/sửa dòng -> signal tăng thế hệ -> key mới
+COUNT_CACHE_TIMEOUT = 60
+
+
+def query_models(queryset):
+    # Model của bảng chính và các bảng JOIN (lọc theo category__..., select_related)
+    tables = {join.table_name for join in queryset.query.alias_map.values()}
+    models = [model for model in apps.get_models() if model._meta.db_table in tables]
+    return models if queryset.model in models else [queryset.model, *models]
+
+
+def cached_count(object_list):
+    if not hasattr(object_list, 'query'):
+        return len(object_list)
+    try:
+        sql = str(object_list.query)
+    except EmptyResultSet:
+        return 0
+    generations = response_cache.current_generations(query_models(object_list))
+    key = 'paginator:count:' + hashlib.md5(f'{sql}|{generations}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = object_list.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+class KeysetPagination(PageNumberPagination):
+    # Mặc định giữ nguyên phân trang theo ?page= (frontend đang dùng page và count).
+    # Có ?cursor= (rỗng = trang đầu) -> phân trang keyset theo thứ tự của queryset + id:
+    # WHERE (các cột sắp xếp) > giá trị của dòng cuối trang trước, không OFFSET,
+    # trang sâu tốn như trang đầu
+    django_paginator_class = CachedCountPaginator
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.page_size = self.get_page_size(request) or self.page_size
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*[('-' if desc else '') + f for f, desc in self.ordering])
+        self.count = cached_count(queryset)
+
+        direction, values = self.decode_cursor(request.query_params[self.cursor_query_param])
+        if direction == 'before':
+            queryset = queryset.filter(self.keyset_filter(values, reverse=True)).reverse()
+        elif direction == 'after':
+            queryset = queryset.filter(self.keyset_filter(values))
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if direction == 'before':
+            rows.reverse()
+        self.has_next = has_more if direction != 'before' else True
+        self.has_previous = direction == 'after' or (direction == 'before' and has_more)
+        self.page_rows = rows
+        return rows
+
+    def get_ordering(self, queryset):
+        # [(tên cột, giảm dần)], luôn kết thúc bằng id để thứ tự là duy nhất
+        ordering = []
+        for field in queryset.query.order_by or ('id',):
+            if not isinstance(field, str) or '__' in field or field.startswith('?'):
+                raise NotFound('Không hỗ trợ phân trang cursor với thứ tự này')
+            name = field.lstrip('-')
+            ordering.append(('id' if name == 'pk' else name, field.startswith('-')))
+        if ordering[-1][0] != 'id':
+            ordering.append(('id', False))
+        return ordering
+
+    def keyset_filter(self, values, reverse=False):
+        # (a, b, id) > (va, vb, vid) viết thành OR của các điều kiện bằng nhau ở cột trước
+        condition = Q()
+        for i, (field, desc) in enumerate(self.ordering):
+            lookup = 'lt' if desc != reverse else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[i]})
+            for prev_field, _ in self.ordering[:i]:
+                step &= Q(**{prev_field: values[self.field_index(prev_field)]})
+            condition |= step
+        return condition
+
+    def field_index(self, field):
+        return [f for f, _ in self.ordering].index(field)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            direction, values = payload['d'], payload['v']
+            if direction not in ('after', 'before') or len(values) != len(self.ordering):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            raise NotFound('Cursor không hợp lệ')
+        return direction, values
+
+    def encode_cursor(self, direction, row):
+        values = [getattr(row, field) for field, _ in self.ordering]
+        payload = json.dumps({'d': direction, 'v': values}, default=str)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def cursor_link(self, direction, row):
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(direction, row))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_rows:
+            return None
+        return self.cursor_link('after', self.page_rows[-1])
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_rows:
+            return None
+        return self.cursor_link('before', self.page_rows[0])
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class CoursePaginator(KeysetPagination):
     page_size = 10
 
-class TeacherCoursePaginator(PageNumberPagination):
+class TeacherCoursePaginator(KeysetPagination):
     page_size = 5
 
-class RecommendCoursePaginator(PageNumberPagination):
-    page_size = 4
\ No newline at end of file
+class RecommendCoursePaginator(KeysetPagination):
+    page_size = 4
@@ -0,0 +1,50 @@
+from collections import Counter
+
+from django.db import connection, transaction
+
+from . import collaborative, response_cache, stats
+from .loaders import CourseLoader
+from .models import Chapter, UserProgress
+
+# Cập nhật tiến độ nhiều chương trong 1 request: 1 câu INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE
+# theo unique (student, chapter) thay vì update_or_create từng chương
+BATCH_SIZE = 500
+
+
+def save_batch(user, items):
+    # items: {chapter_id: is_completed}. Trả về {course_id: % tiến độ} của các khóa học liên quan,
+    # None nếu chưa mua. ValueError nếu có chương không tồn tại
+    student = user.student
+    chapter_course = dict(Chapter.objects.filter(id__in=items).values_list('id', 'course_id'))
+    missing = set(items) - set(chapter_course)
+    if missing:
+        raise ValueError(f'Không có chương {", ".join(map(str, sorted(missing)))}')
+
+    with transaction.atomic():
+        # Khóa các dòng đã có để tính đúng phần chênh lệch completion_count
+        before = dict(UserProgress.objects.select_for_update().filter(student=student, chapter_id__in=items)
+                      .values_list('chapter_id', 'is_completed'))
+        # MySQL không hỗ trợ chỉ định cột unique cho upsert (dùng mọi unique index của bảng)
+        unique_fields = ['student', 'chapter'] if connection.features.supports_update_conflicts_with_target else None
+        UserProgress.objects.bulk_create(
+            [UserProgress(student=student, chapter_id=chapter_id, is_completed=is_completed)
+             for chapter_id, is_completed in items.items()],
+            batch_size=BATCH_SIZE, update_conflicts=True, update_fields=['is_completed', 'update_date'],
+            unique_fields=unique_fields)
+
+        # bulk_create không gửi signal: tự cộng CourseStats và đánh dấu thay đổi như các signal của UserProgress
+        deltas = Counter()
+        for chapter_id, is_completed in items.items():
+            deltas[chapter_course[chapter_id]] += int(is_completed) - int(before.get(chapter_id, False))
+        for course_id, delta in deltas.items():
+            stats.change({'course_id': course_id}, completion_count=delta)
+        transaction.on_commit(collaborative.mark_changed)
+        transaction.on_commit(lambda: response_cache.bump_user(user.id))
+
+    course_ids = set(chapter_course.values())
+    chapters = {course_id: [] for course_id in course_ids}
+    for chapter_id, course_id in Chapter.objects.filter(course_id__in=course_ids).values_list('id', 'course_id'):
+        chapters[course_id].append(chapter_id)
+    loader = CourseLoader.from_chapters(chapters, user)
+    return {course_id: loader.progress(course_id) if loader.is_purchased(course_id) else None
+            for course_id in course_ids}
@@ -0,0 +1,385 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.db import connection
+from scipy import sparse
+
+from .models import Course, Purchase, Rating, Comment
+from . import collaborative, counters
+from .similarity import TopKIndex, blend_scores, exact_neighbors, merge_neighbors
+
+logger = logging.getLogger(__name__)
+
+# Nhật ký thay đổi dùng chung giữa các worker (qua cache): mỗi lần Course thay đổi
+# tăng SEQ_KEY và lưu danh sách id thay đổi vào CHANGE_KEY.format(seq)
+SEQ_KEY = 'recommender:seq'
+CHANGE_KEY = 'recommender:change:{}'
+
+# Fit lại toàn bộ TF-IDF khi số khóa học cập nhật tăng dần vượt quá tỉ lệ này
+# (từ vựng của vectorizer chỉ được cập nhật khi fit lại)
+REFIT_RATIO = 0.1
+
+# Định dạng artifact trên đĩa, tăng khi thay đổi cấu trúc file
+ARTIFACT_FORMAT = 1
+CURRENT_FILE = 'CURRENT'
+KEEP_ARTIFACTS = 3
+
+# Cache kết quả gợi ý: 1 key cho mỗi (học viên, khóa học, phiên bản). Phiên bản gồm seq của mô hình và
+# thế hệ tương tác của học viên (tăng khi mua/đánh giá/bình luận), tăng thế hệ = bỏ mọi kết quả cũ
+STUDENT_CACHE_KEY = 'recommend:student:{}:{}'
+STUDENT_GENERATION_KEY = 'recommend:student:{}:generation'
+STUDENT_CACHE_TIMEOUT = 60 * 60
+
+
+def make_vectorizer():
+    # Import khi cần: sklearn tốn ~1s, worker load artifact từ đĩa không cần tới
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    # stop_words='english': loại bỏ các từ thông dụng: the, and of
+    return TfidfVectorizer(stop_words='english', norm='l2')
+
+
+def publish_changes(course_ids):
+    return counters.publish(SEQ_KEY, CHANGE_KEY, course_ids)
+
+
+def changes_since(seq):
+    return counters.changes_since(SEQ_KEY, CHANGE_KEY, seq)
+
+
+class Snapshot:
+    # Trạng thái bất biến của recommender, được thay thế nguyên khối khi cập nhật.
+    # vectorizer có thể là hàm tạo (lazy) để worker không phải dựng lại từ vựng khi khởi động
+    def __init__(self, vectorizer, matrix, index, seq, updates=0):
+        self._vectorizer = vectorizer
+        self.matrix = matrix
+        self.index = index
+        self.seq = seq
+        self.updates = updates
+
+    @property
+    def vectorizer(self):
+        if callable(self._vectorizer):
+            self._vectorizer = self._vectorizer()
+        return self._vectorizer
+
+
+# === Lưu / đọc artifact ===
+def save_artifacts(snapshot, root=None):
+    # Ghi vào thư mục phiên bản mới rồi đổi con trỏ CURRENT (os.replace là atomic)
+    root = root or settings.RECOMMENDER_ARTIFACTS_DIR
+    version = f"{timezone.now():%Y%m%d%H%M%S}-{snapshot.seq}"
+    path = os.path.join(root, version)
+    os.makedirs(path, exist_ok=True)
+
+    index, matrix, vectorizer = snapshot.index, snapshot.matrix, snapshot.vectorizer
+    arrays = {
+        'ids': index.ids, 'neighbors': index.neighbors, 'scores': index.scores,
+        'matrix_data': matrix.data, 'matrix_indices': matrix.indices, 'matrix_indptr': matrix.indptr,
+        'idf': vectorizer.idf_ if index.ids.size else np.zeros(0),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(array))
+    vocabulary = getattr(vectorizer, 'vocabulary_', {})
+    with open(os.path.join(path, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+        json.dump({term: int(col) for term, col in vocabulary.items()}, f, ensure_ascii=False)
+    with open(os.path.join(path, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'format': ARTIFACT_FORMAT, 'seq': snapshot.seq, 'k': index.k,
+                   'courses': len(index), 'matrix_shape': list(matrix.shape)}, f)
+
+    tmp = os.path.join(root, CURRENT_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+    versions = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    for old in versions[:-KEEP_ARTIFACTS]:
+        if old != version:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return path
+
+
+def load_artifacts(root=None):
+    # Memory-map read-only: các worker dùng chung page cache, không cần fit sklearn
+    root = root or settings.RECOMMENDER_ARTIFACTS_DIR
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            path = os.path.join(root, f.read().strip())
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest['format'] != ARTIFACT_FORMAT:
+        logger.warning('Ignoring recommender artifacts with format %s', manifest['format'])
+        return None
+
+    def load(name):
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+    matrix = sparse.csr_matrix((load('matrix_data'), load('matrix_indices'), load('matrix_indptr')),
+                               shape=tuple(manifest['matrix_shape']), copy=False)
+    index = TopKIndex(load('ids'), load('neighbors'), load('scores'))
+
+    def vectorizer():
+        with open(os.path.join(path, 'vocabulary.json'), encoding='utf-8') as f:
+            vocabulary = json.load(f)
+        if not vocabulary:
+            return make_vectorizer()
+        v = make_vectorizer()
+        v.set_params(vocabulary=vocabulary)
+        v.idf_ = np.array(load('idf'))
+        return v
+
+    return Snapshot(vectorizer, matrix, index, manifest['seq'])
+
+
+class RecommenderEngine:
+    def __init__(self, k=None):
+        self.k = k or settings.RECOMMENDER_TOP_K
+        self._snapshot = None
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = set()
+        self._pending_rebuild = False
+        self._pending_seq = None
+        # seq của nhật ký đã được đưa vào hàng đợi (snapshot hiện tại chỉ nhận seq mới khi cập nhật xong)
+        self._queued_seq = None
+        self._worker = None
+        self._synced_at = 0
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            with self._write_lock:
+                if self._snapshot is None:
+                    self._snapshot = load_artifacts() or self._build()
+        return self._snapshot
+
+    def neighbors_of(self, course_id):
+        self.sync()
+        return self.snapshot.index.neighbors_of(course_id)
+
+    # === Xây dựng lại toàn bộ ===
+    def rebuild(self):
+        with self._write_lock:
+            self._snapshot = self._build()
+        return self._snapshot
+
+    def _build(self):
+        # Đọc seq trước khi đọc dữ liệu: thay đổi xảy ra trong lúc build sẽ được áp dụng lại
+        seq = cache.get(SEQ_KEY, 0)
+        rows = list(Course.objects.filter(publish=True).order_by('id').values_list('id', 'title'))
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        vectorizer = make_vectorizer()
+        if rows:
+            matrix = vectorizer.fit_transform([r[1] for r in rows]).tocsr()
+        else:
+            matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+        return Snapshot(vectorizer, matrix, TopKIndex.build(ids, matrix, k=self.k, ann=settings.RECOMMENDER_ANN), seq)
+
+    # === Cập nhật tăng dần ===
+    def refresh(self, course_ids, seq=None):
+        # Chỉ tính lại vector và danh sách hàng xóm liên quan tới các khóa học thay đổi.
+        # seq: vị trí trong nhật ký mà snapshot mới phản ánh, chỉ được gán khi snapshot mới được cài
+        with self._write_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return None
+            course_ids = set(course_ids)
+            titles = dict(Course.objects.filter(id__in=course_ids, publish=True).values_list('id', 'title'))
+            removed = course_ids - set(titles)
+            updates = snapshot.updates + len(course_ids)
+            if not snapshot.index.ids.size or updates > REFIT_RATIO * len(snapshot.index):
+                self._snapshot = self._build()
+            else:
+                self._snapshot = self._apply(snapshot, titles, removed, updates,
+                                             snapshot.seq if seq is None else seq)
+        return self._snapshot
+
+    def _apply(self, snapshot, titles, removed, updates, seq):
+        touched = np.fromiter(set(titles) | removed, dtype=np.int64)
+        old = snapshot.index
+        keep = ~np.isin(old.ids, touched)
+        new_ids = np.fromiter(titles.keys(), dtype=np.int64, count=len(titles))
+        if titles:
+            new_rows = snapshot.vectorizer.transform(list(titles.values())).tocsr()
+        else:
+            new_rows = sparse.csr_matrix((0, snapshot.matrix.shape[1]), dtype=snapshot.matrix.dtype)
+
+        ids = np.concatenate([old.ids[keep], new_ids])
+        matrix = sparse.vstack([snapshot.matrix[keep], new_rows], format='csr')
+        n_keep = int(keep.sum())
+        k = old.k
+        # Copy-on-write: snapshot cũ vẫn được dùng để phục vụ trong lúc tính toán
+        neighbors = np.vstack([old.neighbors[keep], np.full((len(new_ids), k), -1, dtype=np.int64)])
+        scores = np.vstack([old.scores[keep], np.zeros((len(new_ids), k), dtype=np.float32)])
+
+        # Dòng có hàng xóm bị thay đổi/xóa: tính lại chính xác
+        stale = np.isin(neighbors[:n_keep], touched).any(axis=1)
+        fresh = np.flatnonzero(~stale)
+        if len(new_ids) and len(fresh):
+            # Dòng còn lại: chỉ cần gộp thêm các khóa học mới nếu chúng lọt vào top-k
+            candidates = np.asarray((matrix[fresh] @ new_rows.T).todense(), dtype=np.float32)
+            better = (candidates > scores[fresh, -1:]).any(axis=1)
+            rows = fresh[better]
+            if len(rows):
+                neighbors[rows], scores[rows] = merge_neighbors(
+                    neighbors[rows], scores[rows],
+                    np.broadcast_to(new_ids, (len(rows), len(new_ids))), candidates[better], k)
+
+        recompute = np.concatenate([np.flatnonzero(stale), np.arange(n_keep, len(ids))])
+        if len(recompute):
+            neighbors[recompute], scores[recompute] = exact_neighbors(
+                matrix[recompute], matrix, ids, k, self_cols=recompute)
+
+        # TopKIndex yêu cầu ids tăng dần
+        order = np.argsort(ids, kind='stable')
+        ids, matrix, neighbors, scores = ids[order], matrix[order], neighbors[order], scores[order]
+        return Snapshot(snapshot.vectorizer, matrix, TopKIndex(ids, neighbors, scores), seq, updates)
+
+    # === Đồng bộ giữa các worker ===
+    def sync(self, force=False):
+        now = time.monotonic()
+        if self._snapshot is None or (not force and now - self._synced_at < settings.RECOMMENDER_SYNC_INTERVAL):
+            return
+        self._synced_at = now
+        with self._pending_lock:
+            last = self._snapshot.seq if self._queued_seq is None else self._queued_seq
+        try:
+            seq, course_ids = changes_since(last)
+        except Exception as ex:
+            logger.warning('Recommender sync failed: %s', ex)
+            return
+        if seq == last:
+            return
+        if course_ids is None:
+            # Thiếu một phần nhật ký (hết hạn hoặc cache bị xóa): xây dựng lại toàn bộ
+            self.schedule_rebuild(seq)
+        else:
+            self.schedule_refresh(course_ids, seq)
+
+    def schedule_refresh(self, course_ids, seq=None):
+        with self._pending_lock:
+            self._pending.update(course_ids)
+            self._queue(seq)
+
+    def schedule_rebuild(self, seq=None):
+        with self._pending_lock:
+            self._pending_rebuild = True
+            self._queue(seq)
+
+    def _queue(self, seq):
+        # Gọi khi đang giữ _pending_lock
+        if seq is not None:
+            self._pending_seq = self._queued_seq = seq
+        self._start_worker()
+
+    def _start_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._drain, daemon=True)
+            self._worker.start()
+
+    def _drain(self):
+        # Cập nhật chạy nền, request vẫn đọc snapshot cũ cho tới khi snapshot mới được gán
+        try:
+            while True:
+                with self._pending_lock:
+                    course_ids, rebuild, seq = self._pending, self._pending_rebuild, self._pending_seq
+                    self._pending, self._pending_rebuild, self._pending_seq = set(), False, None
+                    if not course_ids and not rebuild:
+                        # snapshot đã phản ánh mọi thay đổi trong hàng đợi
+                        self._queued_seq = None
+                        self._worker = None
+                        return
+                try:
+                    if rebuild:
+                        self.rebuild()
+                    else:
+                        self.refresh(course_ids, seq)
+                except Exception:
+                    logger.exception('Recommender refresh failed')
+                    # snapshot vẫn giữ seq cũ: bỏ hàng đợi, lần sync sau đọc lại nhật ký từ seq đó
+                    with self._pending_lock:
+                        self._pending, self._pending_rebuild, self._pending_seq = set(), False, None
+                        self._queued_seq = None
+                        self._worker = None
+                    return
+        finally:
+            connection.close()
+
+
+engine = RecommenderEngine()
+
+
+# === Xếp hạng ===
+def ranked_neighbors(product_id, cf_weight=None):
+    # Điểm TF-IDF trộn với collaborative filtering (các khóa học thường được mua/học cùng nhau),
+    # None nếu khóa học không có trong danh mục
+    similar = engine.neighbors_of(product_id)
+    if similar is None:
+        return None
+    if cf_weight is None:
+        cf_weight = settings.RECOMMENDER_CF_WEIGHT
+    ids, _ = blend_scores([(similar, 1 - cf_weight), (collaborative.engine.neighbors_of(product_id), cf_weight)])
+    return ids
+
+
+def ranked_for_seeds(seed_ids, exclude=(), limit=10, cf_weight=None):
+    # Gộp danh sách tương đồng của nhiều khóa học trong 1 lần cộng điểm (blend_scores),
+    # khóa học xuất hiện ở nhiều danh sách được cộng dồn điểm, loại bỏ seed và exclude
+    if cf_weight is None:
+        cf_weight = settings.RECOMMENDER_CF_WEIGHT
+    sources = []
+    for seed_id in seed_ids:
+        sources.append((engine.neighbors_of(seed_id), 1 - cf_weight))
+        sources.append((collaborative.engine.neighbors_of(seed_id), cf_weight))
+    ids, _ = blend_scores(sources)
+    skip = np.fromiter(set(seed_ids) | set(exclude), dtype=np.int64)
+    return ids[~np.isin(ids, skip)][:limit].tolist()
+
+
+def interacted_course_ids(student):
+    # Các khóa học học viên đã mua/đánh giá/bình luận, gộp trong 1 truy vấn (UNION),
+    # tương tác gần nhất trước (theo update_date)
+    purchased = Purchase.objects.filter(student=student).values_list('course_id', 'update_date')
+    rated = Rating.objects.filter(student=student).values_list('course_id', 'update_date')
+    commented = Comment.objects.filter(student=student).values_list('course_id', 'update_date')
+    rows = purchased.union(rated, commented).order_by('-update_date')
+    return list(dict.fromkeys(course_id for course_id, _ in rows))
+
+
+# === Cache gợi ý theo học viên ===
+def model_version(student_id):
+    # Phiên bản của dữ liệu dùng để gợi ý: seq của các snapshot đang dùng (danh mục khóa học,
+    # collaborative filtering, chỉ đổi khi snapshot mới được cài) + thế hệ tương tác của học viên.
+    # Lấy trước khi tính gợi ý rồi truyền vào cache_recommendations: request bắt đầu trước khi
+    # học viên mua/đánh giá không lưu được kết quả cũ dưới phiên bản mới
+    generation = cache.get(STUDENT_GENERATION_KEY.format(student_id), 0)
+    return engine.snapshot.seq, collaborative.engine.snapshot.seq, generation
+
+
+def recommendation_key(student_id, product_id, version):
+    digest = hashlib.md5(repr((product_id, version)).encode()).hexdigest()
+    return STUDENT_CACHE_KEY.format(student_id, digest)
+
+
+def get_cached_recommendations(student_id, product_id, version):
+    return cache.get(recommendation_key(student_id, product_id, version))
+
+
+def cache_recommendations(student_id, product_id, data, version):
+    cache.set(recommendation_key(student_id, product_id, version), data, STUDENT_CACHE_TIMEOUT)
+
+
+def invalidate_student(student_id):
+    # Khởi tạo theo thời gian (ms): cache bị xóa thì thế hệ mới vẫn lớn hơn thế hệ của các key cũ
+    counters.incr(STUDENT_GENERATION_KEY.format(student_id), initial=int(time.time() * 1000))
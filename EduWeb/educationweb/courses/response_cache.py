@@ -0,0 +1,71 @@
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from . import conditional
+
+# Mỗi model có 1 bộ đếm thế hệ (generation), signal tăng bộ đếm khi model thay đổi.
+# Key của response chứa thế hệ hiện tại của các model liên quan -> tăng bộ đếm là mọi trang
+# đã cache hết hiệu lực ngay (O(1), không cần tìm/xóa từng key), key cũ tự hết hạn
+GENERATION_KEY = 'generation:{}'
+USER_GENERATION_KEY = 'generation:user:{}'
+RESPONSE_KEY = 'response:{}:{}'
+RESPONSE_TIMEOUT = 5 * 60
+
+
+def bump(model):
+    conditional.incr(GENERATION_KEY.format(model._meta.label_lower))
+
+
+def bump_user(user_id):
+    conditional.incr(USER_GENERATION_KEY.format(user_id))
+
+
+def current_generations(models):
+    keys = [GENERATION_KEY.format(model._meta.label_lower) for model in models]
+    generations = cache.get_many(keys)
+    return [generations.get(key, 0) for key in keys]
+
+
+def normalize_params(query_params):
+    # Bỏ tham số rỗng, bỏ khoảng trắng thừa, sắp xếp: ?b=2&a=1 và ?a=1&b=2&c= dùng chung 1 key
+    params = []
+    for key in sorted(query_params):
+        for value in sorted(query_params.getlist(key)):
+            value = ' '.join(value.split())
+            if value:
+                params.append(f'{key}={value}')
+    return '&'.join(params)
+
+
+def cache_list_response(models, per_user=False, timeout=RESPONSE_TIMEOUT):
+    # Decorator cho action trả về danh sách (list) của viewset.
+    # models: các model có dữ liệu trong response; per_user: response có dữ liệu riêng của
+    # người dùng (đã mua, tiến độ) -> key thêm id và thế hệ riêng của người dùng
+    generation_keys = [GENERATION_KEY.format(model._meta.label_lower) for model in models]
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            keys = list(generation_keys)
+            user = request.user
+            if per_user:
+                keys.append(USER_GENERATION_KEY.format(user.id if user.is_authenticated else 0))
+            generations = cache.get_many(keys)
+            parts = [type(self).__name__, func.__name__, normalize_params(request.query_params),
+                     *[f'{k}={generations.get(k, 0)}' for k in keys]]
+            if per_user:
+                parts.append(f'user={user.id if user.is_authenticated else 0}')
+            key = RESPONSE_KEY.format(type(self).__name__, hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = func(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,37 @@
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+# Bảng DailyRevenue: mỗi dòng là (giáo viên, khóa học, ngày) -> doanh thu, số lượt bán.
+# Mỗi Purchase mới cộng vào dòng của ngày mua (Purchase.price: giá lúc mua), thống kê chỉ cần GROUP BY
+# trên bảng nhỏ này thay vì duyệt toàn bộ Purchase
+
+
+def record(course, day, price, sign=1):
+    # sign=1: thêm 1 lượt bán, sign=-1: hủy 1 lượt bán (xóa Purchase, trừ đúng số tiền đã cộng)
+    DailyRevenue = global_apps.get_model('courses', 'DailyRevenue')
+    key = {'teacher_id': course.teacher_id, 'course_id': course.id, 'day': day}
+    changes = {'revenue': F('revenue') + sign * price, 'sales': F('sales') + sign}
+    if DailyRevenue.objects.filter(**key).update(**changes) or sign < 0:
+        return
+    try:
+        with transaction.atomic():
+            DailyRevenue.objects.create(**key, revenue=price, sales=1)
+    except IntegrityError:
+        # Request khác vừa tạo dòng của ngày này
+        DailyRevenue.objects.filter(**key).update(**changes)
+
+
+def rebuild(apps=global_apps):
+    # Tính lại toàn bộ từ Purchase (theo giá lúc mua)
+    DailyRevenue = apps.get_model('courses', 'DailyRevenue')
+    Purchase = apps.get_model('courses', 'Purchase')
+    rows = (Purchase.objects.values('course_id', 'course__teacher_id', 'create_date')
+            .annotate(revenue=Sum('price'), sales=Count('id')).order_by())
+    with transaction.atomic():
+        DailyRevenue.objects.all().delete()
+        DailyRevenue.objects.bulk_create([
+            DailyRevenue(teacher_id=row['course__teacher_id'], course_id=row['course_id'], day=row['create_date'],
+                         revenue=row['revenue'] or 0, sales=row['sales'])
+            for row in rows
+        ], batch_size=1000)
@@ -0,0 +1,306 @@
+import bisect
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from . import counters
+from .models import Chapter, Course
+from .text import edit_distance, tokenize, trigrams
+
+logger = logging.getLogger(__name__)
+
+# Nhật ký thay đổi dùng chung giữa các worker (giống recommender): mỗi thay đổi của
+# Course/Chapter/Category tăng SEQ_KEY và lưu id các khóa học cần index lại
+SEQ_KEY = 'search:seq'
+CHANGE_KEY = 'search:change:{}'
+
+# Số kết quả tối đa của 1 lần tìm (sau khi lọc theo queryset), sắp xếp theo độ liên quan trong SQL
+# (CASE theo id): câu SQL và COUNT không lớn dần theo số khóa học khớp
+MAX_RESULTS = 1000
+# Số id ứng viên kiểm tra với queryset trong 1 truy vấn (theo thứ tự điểm, dừng khi đủ MAX_RESULTS).
+# Gấp đôi sau mỗi đợt (queryset chỉ chứa ít kết quả khớp, vd: khóa học của 1 giáo viên) tới
+# MAX_CANDIDATE_BATCH, dưới giới hạn số tham số của SQLite (32766)
+CANDIDATE_BATCH = 2000
+MAX_CANDIDATE_BATCH = 16000
+# Số từ tối đa được mở rộng từ 1 tiền tố (vd: "pyth" -> "python", "pythonic")
+MAX_EXPANSIONS = 50
+# Trọng số của từng trường khi tính độ liên quan
+# (search_key chứa cả tiêu đề và mô tả -> từ trong tiêu đề được 2 + 1)
+FIELD_WEIGHTS = {'title': 2.0, 'search_key': 1.0, 'category': 2.0, 'chapter': 1.5}
+# 1 từ được xem là gõ sai của từ trong index nếu có chung trigram và giống nhau (Jaccard
+# theo trigram) >= FUZZY_SIMILARITY hoặc khác nhau <= 1 ký tự (2 ký tự với từ dài >= FUZZY_LONG_WORD)
+FUZZY_SIMILARITY = 0.4
+FUZZY_LONG_WORD = 8
+# Bão hòa tần suất từ (giống BM25): từ lặp lại nhiều lần không làm điểm tăng mãi
+K1 = 1.2
+
+
+def publish_changes(course_ids):
+    return counters.publish(SEQ_KEY, CHANGE_KEY, course_ids)
+
+
+def changes_since(seq):
+    return counters.changes_since(SEQ_KEY, CHANGE_KEY, seq)
+
+
+def documents(course_ids=None):
+    # (course_id, {trường: text}) cho các khóa học, 2 truy vấn cho toàn bộ danh sách.
+    # search_key đã được bỏ dấu sẵn khi lưu (Course.save, Chapter.save)
+    courses = Course.objects.order_by('id')
+    chapters = Chapter.objects.order_by('course_id', 'position')
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+        chapters = chapters.filter(course_id__in=course_ids)
+    chapter_titles = defaultdict(list)
+    for course_id, key in chapters.values_list('course_id', 'search_key').iterator(chunk_size=5000):
+        chapter_titles[course_id].append(key)
+    for course_id, title, key, category in courses.values_list(
+            'id', 'title', 'search_key', 'category__title').iterator(chunk_size=5000):
+        yield course_id, {'title': title, 'search_key': key, 'category': category,
+                          'chapter': ' '.join(chapter_titles[course_id])}
+
+
+class InvertedIndex:
+    # token (đã bỏ dấu) -> {course_id: trọng số}, trọng số = tổng FIELD_WEIGHTS của các lần xuất hiện
+    def __init__(self):
+        self.postings = {}
+        self.trigram_terms = defaultdict(set)  # trigram -> các token chứa trigram đó (tìm gần đúng)
+        self.terms = {}  # course_id -> các token của khóa học (để xóa khi index lại)
+        self._vocabulary = None  # danh sách token đã sắp xếp, để tìm theo tiền tố
+        # Bản sao (copy): posting/tập trigram dùng chung với bản gốc, chỉ sao chép khi bị sửa.
+        # None = không dùng chung gì, sửa trực tiếp
+        self._owned = None
+
+    def __len__(self):
+        return len(self.terms)
+
+    def copy(self):
+        # Bản sao để cập nhật trong khi các request khác vẫn đọc bản cũ (bản cũ không bị sửa)
+        clone = InvertedIndex()
+        clone.postings = dict(self.postings)
+        clone.trigram_terms = defaultdict(set, self.trigram_terms)
+        clone.terms = dict(self.terms)
+        clone._vocabulary = self._vocabulary
+        clone._owned = set()
+        return clone
+
+    def _own(self, name, key, factory):
+        # Phần tử của self.postings / self.trigram_terms được phép sửa trên bản này
+        table = getattr(self, name)
+        if self._owned is not None and (name, key) not in self._owned:
+            self._owned.add((name, key))
+            table[key] = factory(table.get(key, ()))
+        elif key not in table:
+            table[key] = factory()
+        return table[key]
+
+    def add(self, course_id, fields):
+        self.remove(course_id)
+        weights = defaultdict(float)
+        for field, text in fields.items():
+            for token in tokenize(text):
+                weights[token] += FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self._vocabulary = None
+                for gram in trigrams(token):
+                    self._own('trigram_terms', gram, set).add(token)
+            self._own('postings', token, dict)[course_id] = weight
+        self.terms[course_id] = list(weights)
+
+    def remove(self, course_id):
+        for token in self.terms.pop(course_id, ()):
+            posting = self._own('postings', token, dict)
+            del posting[course_id]
+            if not posting:
+                del self.postings[token]
+                self._vocabulary = None
+                for gram in trigrams(token):
+                    self._own('trigram_terms', gram, set).discard(token)
+
+    def expand(self, token):
+        # [(token trong index, hệ số)]: khớp nguyên từ 1.0, khớp tiền tố 0.5,
+        # nếu không có thì tìm từ gần đúng (gõ sai) theo trigram
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self._vocabulary, token)
+        end = bisect.bisect_left(self._vocabulary, token + '\uffff')
+        terms = [(term, 1.0 if term == token else 0.5)
+                 for term in self._vocabulary[start:min(end, start + MAX_EXPANSIONS)]]
+        return terms or self.similar(token)
+
+    def similar(self, token):
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigram_terms.get(gram, ()))
+        max_edits = 2 if len(token) >= FUZZY_LONG_WORD else 1
+        terms = []
+        for term, count in shared.items():
+            similarity = count / (len(grams) + len(trigrams(term)) - count)
+            if similarity < FUZZY_SIMILARITY and (abs(len(term) - len(token)) > max_edits
+                                                  or edit_distance(token, term) > max_edits):
+                continue
+            terms.append((term, 0.5 * max(similarity, 1 - edit_distance(token, term) / len(token))))
+        terms.sort(key=lambda x: -x[1])
+        return terms[:MAX_EXPANSIONS]
+
+    def search(self, query):
+        # [(course_id, điểm)] của mọi khóa học khớp, điểm giảm dần.
+        # Mọi từ trong truy vấn phải xuất hiện (AND), điểm = tổng idf * tf đã bão hòa
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        n = max(len(self.terms), 1)
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for term, boost in self.expand(token):
+                posting = self.postings[term]
+                idf = math.log(1 + n / len(posting))
+                for course_id, weight in posting.items():
+                    score = boost * idf * weight * (K1 + 1) / (weight + K1)
+                    if score > token_scores.get(course_id, 0):
+                        token_scores[course_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {cid: s + token_scores[cid] for cid, s in scores.items() if cid in token_scores}
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+
+
+def id_list(ids):
+    # Điều kiện id IN (...) với id truyền dưới dạng tham số: bỏ qua bước chuẩn hóa từng giá trị
+    # của lookup __in (chậm với vài nghìn id)
+    ids = [int(course_id) for course_id in ids]
+    return RawSQL(f'SELECT id FROM {Course._meta.db_table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+
+
+class InvertedIndexBackend:
+    # Index trong bộ nhớ của mỗi worker, build 1 lần rồi cập nhật theo nhật ký thay đổi.
+    # Chạy được trên mọi database (SQLite khi test)
+    def __init__(self):
+        self.index = None
+        self.seq = None
+        self._lock = threading.Lock()
+
+    def search(self, queryset, query):
+        matched = self.ranked(query)
+        # Index chứa mọi khóa học: chỉ giữ các khóa học thuộc queryset (đã lọc theo giáo viên,
+        # danh mục, publish...), kiểm tra từng đợt theo thứ tự điểm cho tới khi đủ MAX_RESULTS
+        top, start, size = [], 0, CANDIDATE_BATCH
+        while start < len(matched) and len(top) < MAX_RESULTS:
+            batch = matched[start:start + size]
+            allowed = set(queryset.filter(id__in=id_list(course_id for course_id, _ in batch))
+                          .values_list('id', flat=True))
+            top.extend((course_id, score) for course_id, score in batch if course_id in allowed)
+            start, size = start + size, min(size * 2, MAX_CANDIDATE_BATCH)
+        if not top:
+            return queryset.none()
+        top = top[:MAX_RESULTS]
+        rank = Case(*[When(id=course_id, then=Value(score)) for course_id, score in top],
+                    default=Value(0.0), output_field=FloatField())
+        return queryset.filter(id__in=id_list(course_id for course_id, _ in top)) \
+            .annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+    def ranked(self, query):
+        # Chỉ giữ lock khi đồng bộ index, tìm trên bản index hiện tại (không bị sửa) ngoài lock
+        with self._lock:
+            self.sync()
+            index = self.index
+        return index.search(query)
+
+    def sync(self):
+        # Cập nhật trên bản mới rồi thay thế, request đang tìm trên bản cũ không bị ảnh hưởng
+        seq, course_ids = changes_since(self.seq)
+        if course_ids is None:
+            index = InvertedIndex()
+            for course_id, fields in documents():
+                index.add(course_id, fields)
+            self.index = index
+        elif course_ids:
+            index = self.index.copy()
+            for course_id in course_ids:
+                index.remove(course_id)
+            for course_id, fields in documents(course_ids):
+                index.add(course_id, fields)
+            self.index = index
+        self.seq = seq
+
+
+class MySQLFulltextBackend:
+    # Dùng FULLTEXT index (ngram) trên search_key của Course/Chapter (migration 0031) thay cho LIKE '%q%'.
+    # Ứng viên lấy từ 3 truy vấn MATCH dùng được index, sau đó xếp hạng theo tổng điểm.
+    # Mỗi từ phải xuất hiện (BOOLEAN MODE), không có kết quả thì tìm gần đúng theo
+    # số trigram trùng (NATURAL LANGUAGE MODE)
+    CANDIDATES = (
+        'SELECT id FROM courses_course WHERE MATCH(search_key) AGAINST (%s IN {mode}) '
+        'UNION SELECT c.id FROM courses_course c JOIN courses_category k ON k.id = c.category_id '
+        'WHERE MATCH(k.title) AGAINST (%s IN {mode}) '
+        'UNION SELECT course_id FROM courses_chapter WHERE MATCH(search_key) AGAINST (%s IN {mode})'
+    )
+    RANK = (
+        '{search_key} * MATCH(courses_course.search_key) AGAINST (%s IN {{mode}}) '
+        '+ {category} * COALESCE((SELECT MATCH(k.title) AGAINST (%s IN {{mode}}) FROM courses_category k '
+        'WHERE k.id = courses_course.category_id), 0) '
+        '+ {chapter} * COALESCE((SELECT MAX(MATCH(ch.search_key) AGAINST (%s IN {{mode}})) FROM courses_chapter ch '
+        'WHERE ch.course_id = courses_course.id), 0)'
+    ).format(**FIELD_WEIGHTS)
+    # Index ngram được tách theo ngram_token_size của MySQL server (mặc định 2), phải là 3 để
+    # khớp trigram của search_key; sai thì MATCH vẫn chạy nhưng kết quả sai -> báo lỗi ngay
+    NGRAM_TOKEN_SIZE = 3
+
+    def __init__(self):
+        self.checked = False
+
+    def check_server(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT @@ngram_token_size')
+            size = cursor.fetchone()[0]
+        if int(size) != self.NGRAM_TOKEN_SIZE:
+            raise ImproperlyConfigured(
+                f'MySQLFulltextBackend cần ngram_token_size={self.NGRAM_TOKEN_SIZE} trên MySQL server (đang là {size}), '
+                f'đặt trong my.cnf rồi tạo lại index của migration 0031')
+        self.checked = True
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        if not self.checked:
+            self.check_server()
+        results = self.match(queryset, ' '.join(f'+"{token}"' for token in tokens), 'BOOLEAN MODE')
+        if not results.exists():
+            results = self.match(queryset, ' '.join(tokens), 'NATURAL LANGUAGE MODE')
+        return results
+
+    def match(self, queryset, against, mode):
+        params = [against] * 3
+        return queryset.filter(id__in=RawSQL(self.CANDIDATES.format(mode=mode), params)) \
+            .annotate(search_rank=RawSQL(self.RANK.format(mode=mode), params, output_field=FloatField())) \
+            .order_by('-search_rank', 'id')
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.COURSE_SEARCH_BACKEND)()
+    return _backend
+
+
+def search(queryset, query):
+    # Lọc queryset theo từ khóa và sắp xếp theo độ liên quan (giảm dần)
+    return get_backend().search(queryset, query)
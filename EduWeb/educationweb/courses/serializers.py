@@ -4,6 +4,7 @@ from .models import (Category, Course, Teacher, User,
                      Note, QuizQuestion, QuizAnswer, Exam, Question,
                      Answer, StudentAnswer, StudentExam, Qualification)
 from rest_framework import serializers
+from .loaders import CourseLoader
 from embed_video.backends import detect_backend
 
 
@@ -159,6 +160,17 @@ class ExamSerializer(serializers.ModelSerializer):
             for answer_data in answers_data:
                 Answer.objects.create(question=question, **answer_data)
         return exam
+
+
+class CourseListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Nạp dữ liệu cho cả trang 1 lần trước khi serialize từng khóa học
+        courses = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request', None)
+        self.context['course_loader'] = CourseLoader(courses, request.user if request is not None else None)
+        return super().to_representation(courses)
+
+
 class CourseSerializer(serializers.ModelSerializer):
     chapters = ChapterSerializer(many=True, read_only=True)
     teacher = TeacherSerializer()
@@ -168,49 +180,38 @@ class CourseSerializer(serializers.ModelSerializer):
     is_purchased = serializers.SerializerMethodField()
     exam = ExamSerializer(read_only=True)
 
+    def get_loader(self, obj):
+        loader = self.context.get('course_loader')
+        if loader is None or obj not in loader:
+            request = self.context.get('request', None)
+            # public: chỉ serialize phần công khai (để cache), bỏ qua người dùng hiện tại
+            user = request.user if request is not None and not self.context.get('public') else None
+            loader = CourseLoader([obj], user)
+            self.context['course_loader'] = loader
+        return loader
+
     def get_userProgress(self, obj):
-        request = self.context.get('request', None)
-        if request is not None:
-            user = request.user
-            if user.is_authenticated and hasattr(user, 'student') and self.get_is_purchased(obj):
-                return UserProgressSerializer(UserProgress.objects.filter(student=user.student, chapter__course=obj),
-                                              many=True).data
-        return []
+        return UserProgressSerializer(self.get_loader(obj).user_progress.get(obj.id, []), many=True).data
 
     def get_progress(self, obj):
-        request = self.context.get('request', None)
-        if request is not None:
-            user = request.user
-            if user.is_authenticated and hasattr(user, 'student') and self.get_is_purchased(obj):
-                return self.calculate_progress(user.id, obj.id)
+        loader = self.get_loader(obj)
+        if loader.is_purchased(obj.id):
+            return loader.progress(obj.id)
         return None
 
     def get_is_purchased(self, obj):
-        request = self.context.get('request', None)
-        if request is not None:
-            user = request.user
-            if user.is_authenticated and hasattr(user, 'student'):
-                return Purchase.objects.filter(student=user.student, course=obj).exists()
-        return False
-
-    def calculate_progress(self, user_id, course_id):
-        try:
-            student = Student.objects.get(user_id=user_id)
-        except Student.DoesNotExist:
-            return 0
-
-        published_chapters = Chapter.objects.filter(course_id=course_id)
-        published_chapter_ids = published_chapters.values_list('id', flat=True)
-
-        completed_chapters_count = UserProgress.objects.filter(student_id=student,
-                                                               chapter_id__in=published_chapter_ids,
-                                                               is_completed=True).count()
-
-        total_chapters_count = published_chapters.count()
-        if total_chapters_count == 0:
-            return 0
-
-        return (completed_chapters_count / total_chapters_count) * 100
+        return self.get_loader(obj).is_purchased(obj.id)
+
+    @staticmethod
+    def user_overlay(course_id, chapter_ids, user):
+        # Các trường riêng của người dùng (đã mua, tiến độ), ghép với phần công khai đã cache
+        loader = CourseLoader.from_chapters({course_id: chapter_ids}, user)
+        purchased = loader.is_purchased(course_id)
+        return {
+            'userProgress': UserProgressSerializer(loader.user_progress.get(course_id, []), many=True).data,
+            'progress': loader.progress(course_id) if purchased else None,
+            'is_purchased': purchased,
+        }
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
@@ -246,6 +247,7 @@ class CourseSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Course
+        list_serializer_class = CourseListSerializer
         fields = ['id', 'category', 'teacher', 'publish',
                   'price', 'thumbnail','exam', 'chapters', 'title',
                   'description', 'create_date', 'update_date', 'userProgress', 'progress', 'is_purchased']
@@ -298,6 +300,11 @@ class UserProgressSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ProgressItemSerializer(serializers.Serializer):
+    chapter_id = serializers.IntegerField()
+    is_completed = serializers.BooleanField()
+
+
 class RatingSerializer(serializers.ModelSerializer):
     student = StudentSerializer()
 
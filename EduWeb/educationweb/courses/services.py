@@ -0,0 +1,54 @@
+import threading
+
+from decouple import config
+
+
+# Các thư viện nặng (google.generativeai, youtube_transcript_api) chỉ được import
+# khi service được dùng lần đầu, không làm chậm lúc khởi động worker/manage.py
+class GeminiService:
+    def __init__(self, model_name, generation_config):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self._genai = None
+        self._lock = threading.Lock()
+
+    @property
+    def genai(self):
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=config('GEMINI_API_KEY'))
+                    self._genai = genai
+        return self._genai
+
+    def ask(self, prompt):
+        model = self.genai.GenerativeModel(model_name=self.model_name, generation_config=self.generation_config)
+        chat = model.start_chat(history=[])
+        return chat.send_message(prompt).text
+
+
+class TranscriptService:
+    def fetch(self, video_id):
+        # Transcript của video YouTube dạng text, chuỗi rỗng nếu video không có transcript
+        from youtube_transcript_api import YouTubeTranscriptApi
+        from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound
+
+        try:
+            transcript = YouTubeTranscriptApi.get_transcript(video_id)
+        except (TranscriptsDisabled, NoTranscriptFound):
+            return ""
+        return " ".join([entry['text'] for entry in transcript])
+
+
+gemini = GeminiService(
+    model_name="gemini-2.0-flash",
+    generation_config={
+        "temperature": 0,
+        "top_p": 0.95,
+        "top_k": 40,
+        "max_output_tokens": 500,
+        "response_mime_type": "text/plain",
+    },
+)
+transcripts = TranscriptService()
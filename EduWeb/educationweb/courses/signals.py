@@ -1,12 +1,265 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
 from django.dispatch import receiver
-from django.db.models import Max
-from .models import Chapter
-
-@receiver(pre_save, sender=Chapter)
-def set_chapter_position(sender, instance, **kwargs):
-    if instance.pk is None:  # Chỉ set position khi tạo mới
-        max_position = Chapter.objects.filter(course=instance.course).aggregate(Max('position'))['position__max']
-        if max_position is None:
-            max_position = 0
-        instance.position = max_position + 1
+from .models import (Answer, Category, Chapter, Course, CourseStats, Exam, Purchase, Question, QuizAnswer, QuizQuestion,
+                     Rating, Comment, Student, Teacher, User, UserProgress)
+from . import search, autocomplete, course_cache, response_cache, conditional, stats, revenue
+
+# recommender, collaborative, coldstart kéo theo numpy/scipy (~250ms): import trong handler khi có thay đổi,
+# không import lúc django.setup() của mọi lệnh manage.py
+
+
+def course_changed(course_id):
+    from . import recommender
+
+    # Ghi nhận thay đổi cho mọi worker, worker hiện tại cập nhật ngay
+    recommender.publish_changes([course_id])
+    recommender.engine.sync(force=True)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def refresh_recommender(sender, instance, **kwargs):
+    course_id = instance.id
+    transaction.on_commit(lambda: course_changed(course_id))
+    transaction.on_commit(lambda: search.publish_changes([course_id]))
+    transaction.on_commit(lambda: autocomplete.refresh([course_id]))
+
+
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+def refresh_search_chapter(sender, instance, **kwargs):
+    # Tiêu đề chương là một phần nội dung tìm kiếm của khóa học
+    course_id = instance.course_id
+    transaction.on_commit(lambda: search.publish_changes([course_id]))
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Student)
+def invalidate_student_recommendations(sender, instance, **kwargs):
+    # Tương tác hoặc hồ sơ của học viên thay đổi -> xóa cache gợi ý của học viên đó
+    from . import recommender
+
+    student_id = instance.id if sender is Student else instance.student_id
+    transaction.on_commit(lambda: recommender.invalidate_student(student_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_recommendations(sender, instance, update_fields=None, **kwargs):
+    # Trình độ (qualification) dùng để gợi ý khi học viên chưa có tương tác
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    from . import recommender
+
+    student_id = Student.objects.filter(user_id=instance.id).values_list('id', flat=True).first()
+    if student_id is not None:
+        transaction.on_commit(lambda: recommender.invalidate_student(student_id))
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=UserProgress)
+@receiver(post_delete, sender=UserProgress)
+def mark_interactions_changed(sender, instance, **kwargs):
+    from . import collaborative
+
+    # Collaborative filtering được tính lại ở nền theo chu kỳ, ở đây chỉ đánh dấu có thay đổi
+    transaction.on_commit(collaborative.mark_changed)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_coldstart(sender, instance, **kwargs):
+    from . import coldstart
+
+    transaction.on_commit(coldstart.mark_changed)
+    if kwargs.get('created') is False:
+        # Đổi tên danh mục -> index lại các khóa học thuộc danh mục
+        course_ids = list(Course.objects.filter(category_id=instance.id).values_list('id', flat=True))
+        transaction.on_commit(lambda: search.publish_changes(course_ids))
+
+
+def bump_course_versions(course_ids):
+    course_ids = [course_id for course_id in course_ids if course_id is not None]
+    if course_ids:
+        transaction.on_commit(lambda: course_cache.bump(course_ids))
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+@receiver(post_save, sender=Exam)
+@receiver(post_delete, sender=Exam)
+def invalidate_course_payload(sender, instance, **kwargs):
+    # Phần công khai của chi tiết khóa học (course_cache) gồm chương và bài kiểm tra
+    bump_course_versions([instance.id if sender is Course else instance.course_id])
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def invalidate_exam_payload(sender, instance, **kwargs):
+    exams = Exam.objects.filter(id=instance.exam_id) if sender is Question else \
+        Exam.objects.filter(questions__id=instance.question_id)
+    bump_course_versions(exams.values_list('course_id', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_course_payloads(sender, instance, **kwargs):
+    # Tên danh mục nằm trong payload của tất cả khóa học thuộc danh mục
+    bump_course_versions(Course.objects.filter(category_id=instance.id).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_teacher_course_payloads(sender, instance, update_fields=None, **kwargs):
+    # Thông tin giáo viên (tên, avatar...) nằm trong payload của các khóa học của giáo viên
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_course_versions(Course.objects.filter(teacher__user_id=instance.id).values_list('id', flat=True))
+
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+@receiver(post_save, sender=Exam)
+@receiver(post_delete, sender=Exam)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+def bump_list_generation(sender, instance, **kwargs):
+    # Mọi trang danh sách đã cache có dữ liệu của model này hết hiệu lực (response_cache)
+    transaction.on_commit(lambda: response_cache.bump(sender))
+
+
+@receiver(post_save, sender=User)
+def bump_teacher_list_generation(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if Teacher.objects.filter(user_id=instance.id).exists():
+        transaction.on_commit(lambda: response_cache.bump(Teacher))
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_save, sender=UserProgress)
+@receiver(post_delete, sender=UserProgress)
+def bump_user_list_generation(sender, instance, **kwargs):
+    # Trạng thái đã mua / tiến độ nằm trong danh sách khóa học cache theo từng người dùng
+    user_id = Student.objects.filter(id=instance.student_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        transaction.on_commit(lambda: response_cache.bump_user(user_id))
+
+
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+@receiver(post_save, sender=QuizAnswer)
+@receiver(post_delete, sender=QuizAnswer)
+@receiver(post_delete, sender=Chapter)
+def bump_quiz_version(sender, instance, **kwargs):
+    # ETag của chapters/{id}/get_question/ tính từ version này
+    if sender is Chapter:
+        chapter_ids = [instance.id]
+    elif sender is QuizQuestion:
+        chapter_ids = [instance.chapter_id]
+    else:
+        chapter_ids = list(QuizQuestion.objects.filter(id=instance.question_id).values_list('chapter_id', flat=True))
+    transaction.on_commit(lambda: conditional.bump_quiz(chapter_ids))
+
+
+# Số liệu tổng hợp (CourseStats): cộng/trừ phần chênh lệch trong cùng transaction với thay đổi
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, **kwargs):
+    if created:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+@receiver(pre_save, sender=Rating)
+@receiver(pre_save, sender=UserProgress)
+def remember_stats_values(sender, instance, **kwargs):
+    # Giá trị trước khi sửa, để post_save chỉ cộng phần chênh lệch
+    fields = ('course_id', 'rate') if sender is Rating else ('chapter_id', 'is_completed')
+    instance._stats_old = sender.objects.filter(pk=instance.pk).values_list(*fields).first() \
+        if instance.pk is not None else None
+
+
+def stats_states(instance, fields, **kwargs):
+    # (trạng thái trước, trạng thái sau) của các trường được thống kê, None = không tính
+    if kwargs['signal'] is post_delete:
+        return tuple(getattr(instance, f) for f in fields), None
+    after = tuple(instance._meta.get_field(f).to_python(getattr(instance, f)) for f in fields)
+    return getattr(instance, '_stats_old', None), after
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def count_course_ratings(sender, instance, **kwargs):
+    before, after = stats_states(instance, ('course_id', 'rate'), **kwargs)
+    if before == after:
+        return
+    if before is not None:
+        stats.change({'course_id': before[0]}, rating_sum=-before[1], rating_count=-1)
+    if after is not None:
+        stats.change({'course_id': after[0]}, rating_sum=after[1], rating_count=1)
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+def count_course_students(sender, instance, created=False, **kwargs):
+    if created or kwargs['signal'] is post_delete:
+        stats.change({'course_id': instance.course_id}, student_count=1 if created else -1)
+
+
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+def count_course_chapters(sender, instance, created=False, **kwargs):
+    if created or kwargs['signal'] is post_delete:
+        stats.change({'course_id': instance.course_id}, chapter_count=1 if created else -1)
+
+
+@receiver(pre_delete, sender=UserProgress)
+def remember_progress_course(sender, instance, **kwargs):
+    # Khi xóa chương, chương có thể bị xóa trước UserProgress (cascade) -> lấy khóa học trước khi xóa
+    instance._stats_course_id = Chapter.objects.filter(id=instance.chapter_id).values_list('course_id', flat=True).first()
+
+
+@receiver(post_save, sender=UserProgress)
+@receiver(post_delete, sender=UserProgress)
+def count_course_completions(sender, instance, **kwargs):
+    before, after = stats_states(instance, ('chapter_id', 'is_completed'), **kwargs)
+    if before == after:
+        return
+    for state, delta in ((before, -1), (after, 1)):
+        if state is not None and state[0] is not None and state[1]:
+            course_filter = {'course_id': instance._stats_course_id} if kwargs['signal'] is post_delete \
+                else {'course__chapters': state[0]}
+            stats.change(course_filter, completion_count=delta)
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+def record_daily_revenue(sender, instance, created=False, **kwargs):
+    if created:
+        revenue.record(instance.course, instance.create_date, instance.price)
+    elif kwargs['signal'] is post_delete:
+        # Khi xóa khóa học, khóa học có thể đã bị xóa trước Purchase (cascade)
+        course = Course.objects.filter(id=instance.course_id).first()
+        if course is not None:
+            revenue.record(course, instance.create_date, instance.price, sign=-1)
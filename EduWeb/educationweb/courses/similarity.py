@@ -0,0 +1,181 @@
+import numpy as np
+
+# Giới hạn bộ nhớ cho 1 block ma trận tương đồng dense (số phần tử float32)
+BLOCK_ELEMENTS = 16 * 1024 * 1024
+
+# Tham số mặc định của chế độ approximate (LSH), xem lsh_neighbors
+ANN_DEFAULTS = {'tables': 8, 'bits': 16, 'block': 512, 'seed': 0}
+
+
+def validate_ann(k, tables, bits, block):
+    # Tham số sai (vd: RECOMMENDER_ANN = {'block': 1}) báo lỗi rõ ràng thay vì ZeroDivisionError khi build
+    if k < 1 or tables < 1 or not 1 <= bits <= 62 or block < 2:
+        raise ValueError(f'Tham số LSH không hợp lệ: k={k} (>= 1), tables={tables} (>= 1), '
+                         f'bits={bits} (1..62), block={block} (>= 2)')
+
+
+class TopKIndex:
+    # Chỉ giữ k khóa học gần nhất cho mỗi khóa học thay vì ma trận N x N.
+    # ids phải được sắp xếp tăng dần (tra cứu bằng binary search, không cần dict,
+    # nhờ vậy các mảng có thể memory-map và dùng chung giữa các process).
+    # neighbors lưu id khóa học (không phải vị trí dòng), -1 là ô trống.
+    def __init__(self, ids, neighbors, scores):
+        self.ids = ids
+        self.neighbors = neighbors
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, course_id):
+        return self.row_of(course_id) is not None
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.neighbors.nbytes + self.scores.nbytes
+
+    @classmethod
+    def build(cls, ids, matrix, k=50, ann=None):
+        # matrix: ma trận TF-IDF (sparse, đã chuẩn hóa l2) theo đúng thứ tự ids.
+        # ann: None -> chính xác O(N^2); dict tham số LSH -> xấp xỉ, gần tuyến tính theo N
+        ids = np.asarray(ids, dtype=np.int64)
+        if k < 1:
+            raise ValueError(f'k phải >= 1 (k={k})')
+        if ann is not None:
+            neighbors, scores = lsh_neighbors(matrix, ids, k, **ann)
+        else:
+            neighbors, scores = exact_neighbors(matrix, matrix, ids, k, self_cols=np.arange(len(ids)))
+        return cls(ids, neighbors, scores)
+
+    def row_of(self, course_id):
+        row = int(np.searchsorted(self.ids, course_id))
+        if row < len(self.ids) and self.ids[row] == course_id:
+            return row
+        return None
+
+    def neighbors_of(self, course_id):
+        # O(k + log N): trả về (ids, scores) đã sắp xếp giảm dần, None nếu không có khóa học
+        row = self.row_of(course_id)
+        if row is None:
+            return None
+        ids = self.neighbors[row]
+        mask = ids >= 0
+        return ids[mask], self.scores[row][mask]
+
+
+def exact_neighbors(queries, matrix, ids, k, self_cols=None):
+    # Tìm chính xác k dòng của matrix tương đồng nhất với từng dòng của queries.
+    # self_cols[i]: vị trí của queries[i] trong matrix (để loại bỏ chính nó)
+    n = matrix.shape[0]
+    m = queries.shape[0]
+    neighbors = np.full((m, k), -1, dtype=np.int64)
+    scores = np.zeros((m, k), dtype=np.float32)
+    if n == 0 or m == 0:
+        return neighbors, scores
+
+    matrix_t = matrix.T.tocsc()
+    block_size = max(1, BLOCK_ELEMENTS // n)
+    for start in range(0, m, block_size):
+        end = min(start + block_size, m)
+        sims = np.asarray((queries[start:end] @ matrix_t).todense(), dtype=np.float32)
+        if self_cols is not None:
+            sims[np.arange(end - start), self_cols[start:end]] = 0
+        top_rows, top_scores = top_k(sims, k)
+        width = top_rows.shape[1]
+        neighbors[start:end, :width], scores[start:end, :width] = _to_ids(ids[top_rows], top_scores)
+    return neighbors, scores
+
+
+def lsh_neighbors(matrix, ids, k, tables=ANN_DEFAULTS['tables'], bits=ANN_DEFAULTS['bits'],
+                  block=ANN_DEFAULTS['block'], seed=ANN_DEFAULTS['seed']):
+    # Random-projection LSH (SimHash): mỗi bảng băm mỗi khóa học thành `bits` bit theo dấu của
+    # các siêu phẳng ngẫu nhiên rồi sắp xếp theo mã băm, các khóa học có mã giống/gần nhau đứng
+    # cạnh nhau. Thứ tự đó được chia thành các block `block` khóa học (dịch ngẫu nhiên mỗi bảng),
+    # cosine chỉ được tính chính xác trong từng block.
+    # Chi phí ~ tables * N * block thay vì N^2; tăng tables/block -> recall cao hơn, build chậm hơn.
+    validate_ann(k, tables, bits, block)
+    n, d = matrix.shape
+    neighbors = np.full((n, k), -1, dtype=np.int64)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if n < 2:
+        return neighbors, scores
+
+    rng = np.random.default_rng(seed)
+    powers = 1 << np.arange(bits, dtype=np.int64)
+    width = min(k, block - 1)
+    for _ in range(tables):
+        planes = rng.standard_normal((d, bits)).astype(np.float32)
+        codes = (np.asarray(matrix @ planes) > 0) @ powers
+        order = np.argsort(codes, kind='stable')
+
+        candidate_ids = np.full((n, width), -1, dtype=np.int64)
+        candidate_scores = np.zeros((n, width), dtype=np.float32)
+        shift = int(rng.integers(0, block))
+        bounds = [0] + list(range(shift or block, n, block)) + [n]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            rows = order[start:end]
+            if len(rows) < 2:
+                continue
+            sub = matrix[rows]
+            sims = np.asarray((sub @ sub.T).todense(), dtype=np.float32)
+            np.fill_diagonal(sims, 0)
+            cols, top_scores = top_k(sims, width)
+            block_ids, block_scores = _to_ids(ids[rows[cols]], top_scores)
+            candidate_ids[rows, :cols.shape[1]] = block_ids
+            candidate_scores[rows, :cols.shape[1]] = block_scores
+
+        # Bỏ ứng viên đã có trong danh sách (tìm thấy ở bảng trước)
+        block_rows = max(1, BLOCK_ELEMENTS // (width * k))
+        for start in range(0, n, block_rows):
+            end = min(start + block_rows, n)
+            seen = (candidate_ids[start:end, :, None] == neighbors[start:end, None, :]).any(axis=2)
+            candidate_scores[start:end][seen] = 0
+        neighbors, scores = merge_neighbors(neighbors, scores, candidate_ids, candidate_scores, k)
+    return neighbors, scores
+
+
+def merge_neighbors(neighbors, scores, candidate_ids, candidate_scores, k):
+    # Gộp danh sách hiện tại với các ứng viên mới, giữ lại k phần tử tốt nhất
+    all_ids = np.concatenate([neighbors, candidate_ids], axis=1)
+    all_scores = np.concatenate([scores, candidate_scores], axis=1)
+    cols, top_scores = top_k(all_scores, k)
+    return _to_ids(np.take_along_axis(all_ids, cols, axis=1), top_scores)
+
+
+def blend_scores(sources):
+    # sources: [((ids, scores), trọng số), ...] -> (ids, tổng điểm có trọng số) giảm dần
+    ids, scores = [], []
+    for pair, weight in sources:
+        if pair is not None and weight:
+            ids.append(pair[0])
+            scores.append(pair[1] * weight)
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    unique, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(scores))
+    order = np.argsort(-totals, kind='stable')
+    return unique[order], totals[order]
+
+
+def top_k(sims, k):
+    # Lấy k cột có điểm cao nhất cho mỗi dòng, sắp xếp giảm dần
+    n_cols = sims.shape[1]
+    k = min(k, n_cols)
+    if k < n_cols:
+        cols = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        cols = np.tile(np.arange(n_cols), (sims.shape[0], 1))
+    top_scores = np.take_along_axis(sims, cols, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(cols, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _to_ids(top_ids, top_scores):
+    # Bỏ các cặp không tương đồng (score <= 0)
+    k_ids = np.where(top_scores > 0, top_ids, -1)
+    k_scores = np.where(top_scores > 0, top_scores, 0)
+    return k_ids, k_scores
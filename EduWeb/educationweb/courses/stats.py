@@ -0,0 +1,62 @@
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+# Số liệu tổng hợp của khóa học (CourseStats): signal cộng/trừ dần bằng F() trong cùng transaction
+# với thay đổi, rebuild() tính lại từ dữ liệu gốc (lệnh reconcile_course_stats, migration)
+FIELDS = ('rating_sum', 'rating_count', 'student_count', 'chapter_count', 'completion_count')
+
+# (model, cột khóa học, điều kiện, {trường: aggregate})
+SOURCES = [
+    ('Rating', 'course_id', {}, {'rating_sum': Sum('rate'), 'rating_count': Count('id')}),
+    ('Purchase', 'course_id', {}, {'student_count': Count('id')}),
+    ('Chapter', 'course_id', {}, {'chapter_count': Count('id')}),
+    ('UserProgress', 'chapter__course_id', {'is_completed': True}, {'completion_count': Count('id')}),
+]
+
+
+def change(course_filter, **deltas):
+    # vd: change({'course_id': 1}, rating_sum=5, rating_count=1), chỉ 1 câu UPDATE
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if deltas:
+        CourseStats = global_apps.get_model('courses', 'CourseStats')
+        CourseStats.objects.filter(**course_filter).update(**{f: F(f) + d for f, d in deltas.items()})
+
+
+def compute(course_ids=None, apps=global_apps):
+    Course = apps.get_model('courses', 'Course')
+    courses = Course.objects.all() if course_ids is None else Course.objects.filter(id__in=course_ids)
+    stats = {course_id: dict.fromkeys(FIELDS, 0) for course_id in courses.values_list('id', flat=True)}
+    for model_name, course_field, filters, aggregates in SOURCES:
+        queryset = apps.get_model('courses', model_name).objects.filter(**filters)
+        if course_ids is not None:
+            queryset = queryset.filter(**{f'{course_field}__in': course_ids})
+        for row in queryset.values(course_field).annotate(**aggregates).order_by():
+            course_id = row.pop(course_field)
+            if course_id in stats:
+                stats[course_id].update({field: value or 0 for field, value in row.items()})
+    return stats
+
+
+def rebuild(course_ids=None, apps=global_apps):
+    # Tính lại và ghi các dòng bị lệch, trả về (số dòng tạo mới, số dòng sửa).
+    # Khóa các dòng hiện có trước khi tính: các cập nhật F() chạy song song phải chờ và
+    # được cộng vào sau, không bị ghi đè
+    CourseStats = apps.get_model('courses', 'CourseStats')
+    with transaction.atomic():
+        existing = CourseStats.objects.select_for_update()
+        if course_ids is not None:
+            existing = existing.filter(course_id__in=course_ids)
+        existing = {row.course_id: row for row in existing}
+        created, updated = [], []
+        for course_id, values in compute(course_ids, apps).items():
+            row = existing.get(course_id)
+            if row is None:
+                created.append(CourseStats(course_id=course_id, **values))
+            elif any(getattr(row, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(row, field, value)
+                updated.append(row)
+        CourseStats.objects.bulk_create(created, batch_size=1000)
+        CourseStats.objects.bulk_update(updated, FIELDS, batch_size=1000)
+    return len(created), len(updated)
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Dữ liệu giả lập dùng cho benchmark, không dùng trong production
+SUBJECTS = ['python', 'java', 'design', 'marketing', 'yoga', 'health', 'finance', 'music',
+            'photography', 'english', 'data', 'machine', 'learning', 'web', 'react', 'django',
+            'excel', 'accounting', 'drawing', 'guitar', 'piano', 'cooking', 'nutrition', 'fitness',
+            'business', 'leadership', 'sales', 'seo', 'security', 'network', 'cloud', 'docker']
+LEVELS = ['basic', 'beginner', 'advanced', 'intermediate', 'complete', 'masterclass', 'practical']
+TOPICS = ['course', 'bootcamp', 'guide', 'workshop', 'fundamentals', 'projects', 'essentials',
+          'introduction', 'training', 'certification', 'skills', 'tips', 'strategy', 'analysis']
+
+
+def course_titles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    subjects = rng.choice(SUBJECTS, size=(n, 2))
+    levels = rng.choice(LEVELS, size=n)
+    topics = rng.choice(TOPICS, size=n)
+    # Thêm 1 token hiếm để tiêu đề không bị trùng lặp hoàn toàn
+    tags = rng.integers(0, max(n // 20, 1), size=n)
+    return [f'{s[0]} {s[1]} {lv} {tp} t{tag}' for s, lv, tp, tag in zip(subjects, levels, topics, tags)]
+
+
+def populate(n_courses, n_students, purchases_per_student, seed=0):
+    # Tạo dữ liệu giả lập trong DB: mỗi học viên quan tâm 1-2 chủ đề và chủ yếu mua
+    # khóa học thuộc các chủ đề đó (để TF-IDF và collaborative filtering đều có tín hiệu)
+    from .models import Category, Course, Purchase, Qualification, Student, Teacher, User
+    from .text import fold
+    from . import revenue, stats
+
+    rng = np.random.default_rng(seed)
+    qualification, _ = Qualification.objects.get_or_create(name='Sinh viên')
+    teacher_user = User.objects.create(username=f'bench-teacher-{seed}', qualification=qualification,
+                                       is_teacher=True)
+    teacher = Teacher.objects.create(user=teacher_user)
+    categories = [Category.objects.create(title=title) for title in ['Development', 'Design', 'Marketing',
+                                                                      'Health & Fitness', 'Music', 'Business']]
+    titles = course_titles(n_courses, seed)
+    courses = Course.objects.bulk_create([
+        Course(title=title, teacher=teacher, category=categories[i % len(categories)], publish=True,
+               price=int(rng.integers(10, 300)), thumbnail='image/upload/sample.jpg', search_key=fold(title))
+        for i, title in enumerate(titles)])
+    by_subject = {subject: [] for subject in SUBJECTS}
+    for course, title in zip(courses, titles):
+        for word in title.split()[:2]:
+            by_subject[word].append(course.id)
+    all_ids = [c.id for c in courses]
+    prices = {c.id: c.price for c in courses}
+
+    users = User.objects.bulk_create([
+        User(username=f'bench-student-{seed}-{i}', qualification=qualification, is_student=True)
+        for i in range(n_students)])
+    students = Student.objects.bulk_create([Student(user=user) for user in users])
+
+    purchases = []
+    for student in students:
+        subjects = rng.choice(SUBJECTS, size=int(rng.integers(1, 3)), replace=False)
+        pool = [cid for subject in subjects for cid in by_subject[subject]] or all_ids
+        picked = set()
+        for _ in range(purchases_per_student):
+            # 80% mua theo sở thích, 20% mua ngẫu nhiên
+            source = pool if rng.random() < 0.8 else all_ids
+            picked.add(int(rng.choice(source)))
+        purchases.extend(Purchase(student=student, course_id=cid, price=prices[cid]) for cid in picked)
+    Purchase.objects.bulk_create(purchases, batch_size=5000)
+    # bulk_create không gửi signal -> tính CourseStats, DailyRevenue 1 lần
+    stats.rebuild([c.id for c in courses])
+    revenue.rebuild()
+    return courses, students
@@ -1,3 +1,795 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from datetime import date
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from scipy import sparse
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import (autocomplete, coldstart, collaborative, conditional, course_cache, dao, exports, importer, recommender,
+               response_cache, revenue, search, stats)
+from .models import (Answer, Category, Chapter, Course, CourseStats, DailyRevenue, Exam, Purchase, Qualification, Question, QuizQuestion,
+                     Rating, Student, Teacher, User, UserProgress)
+from .similarity import TopKIndex, exact_neighbors, lsh_neighbors
+from .text import fold
+
+# Số truy vấn tối đa cho 1 trang danh sách khóa học, không phụ thuộc số khóa học trong trang
+COURSE_PAGE_QUERY_BUDGET = 12
+
+
+class CourseTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        qualification = Qualification.objects.create(name='Sinh viên')
+        teacher_user = User.objects.create(username='teacher', qualification=qualification, is_teacher=True)
+        self.teacher = Teacher.objects.create(user=teacher_user)
+        self.category = Category.objects.create(title='Development')
+        student_user = User.objects.create(username='student', qualification=qualification, is_student=True)
+        self.student = Student.objects.create(user=student_user)
+        self.client = APIClient()
+        self.client.force_authenticate(student_user)
+
+    def create_courses(self, n, chapters=3):
+        courses = []
+        for i in range(n):
+            course = Course.objects.create(title=f'Course {i}', teacher=self.teacher, category=self.category,
+                                           publish=True, thumbnail='image/upload/sample.jpg')
+            for j in range(chapters):
+                Chapter.objects.create(course=course, title=f'Chapter {j}')
+            exam = Exam.objects.create(title='Exam', teacher=self.teacher, course=course)
+            question = Question.objects.create(exam=exam, content='Question')
+            Answer.objects.create(question=question, content='Answer', is_correct=True)
+            Purchase.objects.create(student=self.student, course=course)
+            UserProgress.objects.create(student=self.student, chapter=course.chapters.first(), is_completed=True)
+            courses.append(course)
+        return courses
+
+    def count_queries(self, url, client=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+
+class CourseSerializerQueryTest(CourseTestCase):
+    def test_course_list_queries_do_not_grow_with_page_size(self):
+        self.create_courses(2)
+        small, _ = self.count_queries('/courses/')
+        self.create_courses(8)
+        full, response = self.count_queries('/courses/')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(small, full)
+        self.assertLessEqual(full, COURSE_PAGE_QUERY_BUDGET)
+
+    def test_cached_count_follows_course_changes(self):
+        courses = self.create_courses(10, chapters=0)
+        self.assertEqual(self.client.get('/courses/').data['count'], 10)
+        # Signal tăng thế hệ của Course sau commit -> COUNT(*) tính lại
+        with mock.patch.object(recommender.engine, 'sync'), self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title='Course 10', teacher=self.teacher, category=self.category, publish=True,
+                                  thumbnail='image/upload/sample.jpg')
+        response = self.client.get('/courses/')
+        self.assertEqual(response.data['count'], 11)
+        self.assertEqual(len(self.client.get('/courses/?page=2').data['results']), 1)
+
+        with mock.patch.object(recommender.engine, 'sync'), self.captureOnCommitCallbacks(execute=True):
+            courses[0].delete()
+        self.assertEqual(self.client.get('/courses/?cursor=').data['count'], 10)
+        self.assertEqual(self.client.get('/courses/?page=2').status_code, 404)
+
+    def test_teacher_courses_query_budget(self):
+        self.create_courses(5)
+        client = APIClient()
+        client.force_authenticate(self.teacher.user)
+        queries, response = self.count_queries('/teachers/get_courses/', client)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertLessEqual(queries, COURSE_PAGE_QUERY_BUDGET)
+
+    def test_course_retrieve_query_budget(self):
+        course = self.create_courses(1)[0]
+        queries, response = self.count_queries(f'/courses/{course.id}/')
+        self.assertEqual(len(response.data['chapters']), 3)
+        self.assertLessEqual(queries, COURSE_PAGE_QUERY_BUDGET)
+
+    def test_progress_and_purchase_fields(self):
+        purchased, other = self.create_courses(2)
+        Purchase.objects.filter(course=other).delete()
+        _, response = self.count_queries('/courses/')
+        results = {c['id']: c for c in response.data['results']}
+
+        self.assertTrue(results[purchased.id]['is_purchased'])
+        self.assertAlmostEqual(results[purchased.id]['progress'], 100 / 3)
+        self.assertEqual(len(results[purchased.id]['userProgress']), 1)
+        self.assertEqual(results[purchased.id]['exam']['questions'][0]['answers'][0]['content'], 'Answer')
+
+        self.assertFalse(results[other.id]['is_purchased'])
+        self.assertIsNone(results[other.id]['progress'])
+        self.assertEqual(results[other.id]['userProgress'], [])
+
+    def test_course_retrieve_conditional_get(self):
+        course = self.create_courses(1)[0]
+        response = self.client.get(f'/courses/{course.id}/')
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/courses/{course.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Chapter.objects.create(course=course, title='New chapter')
+        response = self.client.get(f'/courses/{course.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['chapters']), 4)
+
+    def test_course_retrieve_public_payload_and_user_overlay(self):
+        course = self.create_courses(1)[0]
+        url = f'/courses/{course.id}/'
+        self.client.get(url)
+        self.assertIsNotNone(course_cache.get_public(course.id)[1])
+        # Lần 2: phần công khai lấy từ cache, chỉ còn truy vấn phần riêng của người dùng
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        tables = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('"courses_chapter"', tables)
+        self.assertNotIn('"courses_category"', tables)
+        self.assertTrue(response.data['is_purchased'])
+
+        # Đổi chương / danh mục -> version tăng, payload mới
+        chapter = course.chapters.first()
+        before = course_cache.version(course.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter.title = 'Renamed chapter'
+            chapter.save()
+        self.assertGreater(course_cache.version(course.id), before)
+        before = course_cache.version(course.id)
+        with mock.patch.object(search, 'publish_changes'), self.captureOnCommitCallbacks(execute=True):
+            self.category.title = 'Design'
+            self.category.save()
+        self.assertGreater(course_cache.version(course.id), before)
+        response = self.client.get(url)
+        self.assertIn('Renamed chapter', [c['title'] for c in response.data['chapters']])
+        self.assertEqual(response.data['category']['title'], 'Design')
+
+        # Người dùng khác đọc cùng payload nhưng không mang trạng thái đã mua / tiến độ của học viên
+        self.assertFalse(set(course_cache.USER_FIELDS) & set(course_cache.get_public(course.id)[1]))
+        other = User.objects.create(username='other', qualification=self.student.user.qualification, is_student=True)
+        Student.objects.create(user=other)
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.get(url)
+        self.assertFalse(response.data['is_purchased'])
+        self.assertIsNone(response.data['progress'])
+        self.assertEqual(response.data['userProgress'], [])
+        response = self.client.get(url)
+        self.assertTrue(response.data['is_purchased'])
+        self.assertAlmostEqual(response.data['progress'], 100 / 3)
+
+    def test_cached_course_list_follows_changes_per_user(self):
+        course, other_course = self.create_courses(2)
+        self.client.get('/courses/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/courses/')
+        self.assertEqual(len(context.captured_queries), 0)
+
+        # Sửa khóa học -> thế hệ Course tăng sau commit, danh sách tính lại
+        with mock.patch.object(recommender.engine, 'sync'), self.captureOnCommitCallbacks(execute=True):
+            course.title = 'Renamed course'
+            course.save()
+        response = self.client.get('/courses/')
+        self.assertIn('Renamed course', [c['title'] for c in response.data['results']])
+
+        # Danh sách của học viên khác được cache riêng theo thế hệ của từng người dùng
+        other = User.objects.create(username='other', qualification=self.student.user.qualification, is_student=True)
+        other_student = Student.objects.create(user=other)
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertFalse(any(c['is_purchased'] for c in client.get('/courses/').data['results']))
+        user_generation = response_cache.USER_GENERATION_KEY.format(self.student.user_id)
+        before = cache.get(user_generation)
+        with self.captureOnCommitCallbacks(execute=True):
+            Purchase.objects.create(student=other_student, course=other_course)
+        results = {c['id']: c['is_purchased'] for c in client.get('/courses/').data['results']}
+        self.assertEqual(results, {course.id: False, other_course.id: True})
+        self.assertEqual(cache.get(user_generation), before)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/courses/')
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertTrue(all(c['is_purchased'] for c in response.data['results']))
+
+    def test_unknown_ids_do_not_leave_permanent_version_keys(self):
+        # Quét id không tồn tại: bộ đếm version vẫn được khởi tạo (ETag) nhưng có thời hạn
+        with mock.patch.object(conditional, 'cache', mock.Mock(wraps=cache)) as tracked:
+            self.assertEqual(self.client.get('/courses/999999/').status_code, 404)
+            self.assertEqual(self.client.get('/courses/999999/get_chapter/').status_code, 404)
+        writes = [call for call in tracked.method_calls if call[0] in ('add', 'set')]
+        self.assertTrue(writes)
+        for name, args, kwargs in writes:
+            self.assertEqual(kwargs.get('timeout'), conditional.SEED_TIMEOUT)
+
+    def test_chapter_retrieve_queries_do_not_grow_with_chapters(self):
+        small, large = self.create_courses(1, chapters=2)[0], self.create_courses(1, chapters=20)[0]
+        counts = []
+        for course in (small, large):
+            chapter = course.chapters.order_by('position').first()
+            url = f'/chapters/{chapter.id}/?course_id={course.id}'
+            self.client.get(url)
+            # Phần công khai của khóa học đã có trong cache
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            queries = len(context.captured_queries)
+            self.assertEqual(response.data['chapter']['id'], chapter.id)
+            self.assertEqual(response.data['nextChapter']['position'], chapter.position + 1)
+            counts.append(queries)
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[1], COURSE_PAGE_QUERY_BUDGET)
+
+
+class CourseStatsTest(CourseTestCase):
+    def assertStatsMatch(self, course):
+        row = CourseStats.objects.get(course=course)
+        self.assertEqual({field: getattr(row, field) for field in stats.FIELDS}, stats.compute([course.id])[course.id])
+
+    def test_incremental_updates_match_rebuild(self):
+        course = self.create_courses(1)[0]
+        rating = Rating.objects.create(student=self.student, course=course, rate=4)
+        rating.rate = 2
+        rating.save()
+        chapter = course.chapters.last()
+        UserProgress.objects.update_or_create(student=self.student, chapter=chapter, defaults={'is_completed': True})
+        self.assertStatsMatch(course)
+        self.assertEqual(CourseStats.objects.get(course=course).completion_count, 2)
+
+        chapter.delete()
+        Purchase.objects.filter(course=course).delete()
+        self.assertStatsMatch(course)
+        self.assertEqual(CourseStats.objects.get(course=course).average_rating, 2)
+
+    def test_reconcile_fixes_drift(self):
+        course = self.create_courses(1)[0]
+        CourseStats.objects.filter(course=course).update(student_count=99)
+        self.assertEqual(stats.rebuild(), (0, 1))
+        self.assertStatsMatch(course)
+
+
+class TeacherRevenueTest(CourseTestCase):
+    def test_analytics_from_daily_rollup(self):
+        first, second = self.create_courses(2)
+        Course.objects.filter(id=first.id).update(price=100)
+        first.refresh_from_db()
+        other = Student.objects.create(user=User.objects.create(username='other', is_student=True,
+                                                                     qualification=self.student.user.qualification))
+        Purchase.objects.create(student=other, course=first)
+        Purchase.objects.filter(course=second).delete()
+
+        # Doanh thu tính theo giá lúc mua: lượt mua đầu giá 0, lượt sau giá 100
+        self.assertEqual(sorted(DailyRevenue.objects.values_list('course_id', 'revenue', 'sales')),
+                         [(first.id, 100, 2), (second.id, 0, 0)])
+
+        client = APIClient()
+        client.force_authenticate(self.teacher.user)
+        response = client.get('/teachers/analytics/?period=month')
+        self.assertEqual(response.data['total_sales'], 2)
+        self.assertEqual(response.data['total_revenue'], 100)
+        self.assertEqual(response.data['data'], [{'name': first.title, 'total': 100}])
+        self.assertEqual(response.data['series'][0]['sales'], 2)
+
+
+    def test_refund_and_rebuild_use_price_paid(self):
+        course = self.create_courses(1)[0]
+        Course.objects.filter(id=course.id).update(price=100)
+        other = Student.objects.create(user=User.objects.create(username='other', is_student=True,
+                                                                     qualification=self.student.user.qualification))
+        purchase = Purchase.objects.create(student=other, course=Course.objects.get(id=course.id))
+        self.assertEqual(purchase.price, 100)
+
+        # Giáo viên đổi giá: xóa lượt mua trừ đúng 100 đã cộng, tính lại cũng theo giá lúc mua
+        Course.objects.filter(id=course.id).update(price=300)
+        revenue.rebuild()
+        self.assertEqual(list(DailyRevenue.objects.values_list('revenue', 'sales')), [(100, 2)])
+        Purchase.objects.filter(id=purchase.id).delete()
+        self.assertEqual(list(DailyRevenue.objects.values_list('revenue', 'sales')), [(0, 1)])
+        revenue.rebuild()
+        self.assertEqual(list(DailyRevenue.objects.values_list('revenue', 'sales')), [(0, 1)])
+
+    def test_revenue_series_and_admin_stats_by_date_range(self):
+        first, second = self.create_courses(2)
+        DailyRevenue.objects.all().delete()
+        for course, day, amount, sales in ((first, date(2026, 1, 10), 100, 1), (first, date(2026, 1, 20), 200, 2),
+                                           (second, date(2026, 2, 5), 50, 1)):
+            DailyRevenue.objects.create(teacher=self.teacher, course=course, day=day, revenue=amount, sales=sales)
+        user_id = self.teacher.user_id
+
+        self.assertEqual(dao.revenue_series(user_id, 'month'),
+                         [{'period': date(2026, 1, 1), 'total': 300, 'sales': 3},
+                          {'period': date(2026, 2, 1), 'total': 50, 'sales': 1}])
+        self.assertEqual(len(dao.revenue_series(user_id, 'day')), 3)
+        self.assertEqual(dao.revenue_series(user_id, 'month', start=date(2026, 1, 15), end=date(2026, 2, 28)),
+                         [{'period': date(2026, 1, 1), 'total': 200, 'sales': 2},
+                          {'period': date(2026, 2, 1), 'total': 50, 'sales': 1}])
+
+        client = APIClient()
+        client.force_authenticate(self.teacher.user)
+        response = client.get('/teachers/analytics/?period=month&start=2026-02-01&end=2026-02-28')
+        self.assertEqual(response.data['total_revenue'], 50)
+        self.assertEqual(response.data['series'], [{'period': date(2026, 2, 1), 'total': 50, 'sales': 1}])
+        self.assertEqual(client.get('/teachers/analytics/?start=2026-02-01&end=2026-01-01').status_code, 400)
+        self.assertEqual(client.get('/teachers/analytics/?start=2026-13-01').status_code, 400)
+
+        january = dao.admin_stats(date(2026, 1, 1), date(2026, 1, 31))
+        self.assertEqual(january['month'], [{'month': date(2026, 1, 1), 'count': 3}])
+        self.assertEqual(january['sold'], [{'id': self.category.id, 'title': 'Development', 'count': 3}])
+        self.assertEqual([row['count'] for row in dao.admin_stats()['month']], [3, 1])
+        # Kết quả cache theo thế hệ của Purchase: lượt mua mới (sau commit) -> tính lại
+        other = Student.objects.create(user=User.objects.create(username='other', is_student=True,
+                                                                     qualification=self.student.user.qualification))
+        with self.captureOnCommitCallbacks(execute=True):
+            Purchase.objects.create(student=other, course=second)
+        self.assertEqual(sum(row['count'] for row in dao.admin_stats()['year']), 5)
+
+        # Trang admin: khoảng ngày ngược -> bỏ lọc và báo lỗi
+        response = self.client.get('/admin/course-stats/?start=2026-02-01&end=2026-01-01')
+        self.assertIsNone(response.context['start'])
+        self.assertEqual([str(m) for m in response.context['messages']], ['start phải trước hoặc bằng end'])
+
+class ImportCoursesTest(CourseTestCase):
+    LINES = [
+        'type,ref,course,chapter,title,category,price,question,answers',
+        'course,c1,,,Python,Development,100,,',
+        'chapter,ch1,c1,,Intro,,,,',
+        'chapter,ch2,c1,,Variables,,,,',
+        'question,,,ch2,,,,What?,A|*B|C',
+        'course,c2,,,Broken,Missing,0,,',
+        'chapter,,c2,,Orphan,,,,',
+    ]
+
+    def test_csv_import_links_rows_and_skips_invalid_courses(self):
+        courses, errors = importer.parse(self.LINES, 'csv')
+        result = importer.run_import(courses, default_teacher=self.teacher)
+        self.assertEqual((result['courses'], result['chapters'], result['questions'], result['answers']), (1, 2, 1, 3))
+        self.assertEqual(len(errors + result['errors']), 1)
+
+        course = Course.objects.get(title='Python')
+        self.assertEqual(list(course.chapters.order_by('position').values_list('title', 'position')),
+                         [('Intro', 1), ('Variables', 2)])
+        question = QuizQuestion.objects.get(chapter__course=course)
+        self.assertEqual(question.correct_answer.answer, 'B')
+        self.assertEqual(CourseStats.objects.get(course=course).chapter_count, 2)
+
+    def test_rows_reread_by_import_token_ignore_concurrent_inserts(self):
+        # Như MySQL (bulk_create không trả về id); 1 khóa học cùng giáo viên, cùng tên được thêm
+        # đồng thời ngay trước lô import
+        bulk_create = Course.objects.bulk_create
+
+        def concurrent_insert(objs, **kwargs):
+            Course.objects.create(title='Python', teacher=self.teacher, category=self.category)
+            return bulk_create(objs, **kwargs)
+
+        courses, _ = importer.parse(self.LINES, 'csv')
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(Course.objects, 'bulk_create', concurrent_insert):
+            importer.run_import(courses, default_teacher=self.teacher)
+
+        other, imported = Course.objects.filter(title='Python').order_by('id')
+        self.assertIsNone(other.import_token)
+        self.assertFalse(other.chapters.exists())
+        self.assertEqual(list(imported.chapters.order_by('position').values_list('title', flat=True)),
+                         ['Intro', 'Variables'])
+        self.assertEqual(QuizQuestion.objects.get(chapter__course=imported).correct_answer.answer, 'B')
+
+
+class ExportCoursesTest(CourseTestCase):
+    def test_csv_stream_across_batches(self):
+        courses = self.create_courses(7, chapters=0)
+        Course.objects.filter(id=courses[3].id).update(publish=False)
+        batches = exports.batches
+        # Đợt 3 dòng: 6 khóa học đã xuất bản -> 2 đợt đầy + 1 truy vấn rỗng kết thúc
+        with mock.patch.object(exports, 'batches', lambda queryset, chunk_size: batches(queryset, 3)):
+            response = self.client.get('/usercourse/export_csv/')
+            with CaptureQueriesContext(connection) as context:
+                rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertEqual(rows[0], exports.HEADER)
+        self.assertEqual(rows.count(exports.HEADER), 1)
+        ids = [int(row[0]) for row in rows[1:]]
+        self.assertEqual(ids, [c.id for c in courses if c.id != courses[3].id])
+        self.assertEqual(rows[1][-1], exports.course_link(courses[0].id))
+
+    @skipUnless(exports.parquet_available(), 'cần pyarrow')
+    def test_parquet_stream_across_batches(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        courses = self.create_courses(7, chapters=0)
+        data = b''.join(exports.parquet_stream(Course.objects.all(), chunk_size=3))
+        parquet = pq.ParquetFile(pa.BufferReader(data))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual(parquet.read().column('id').to_pylist(), [c.id for c in courses])
+
+    def test_parquet_without_pyarrow(self):
+        with mock.patch.object(exports, 'parquet_available', return_value=False):
+            self.assertEqual(self.client.get('/usercourse/export_parquet/').status_code, 501)
+
+
+class ProgressBatchTest(CourseTestCase):
+    def test_batch_upsert_updates_stats_and_returns_progress(self):
+        course = self.create_courses(1, chapters=4)[0]
+        first, second, third, fourth = course.chapters.order_by('position')
+        payload = [{'chapter_id': first.id, 'is_completed': False}, {'chapter_id': second.id, 'is_completed': True},
+                   {'chapter_id': third.id, 'is_completed': True}]
+        response = self.client.post('/userprogress/batch/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['courses'], [{'course_id': course.id, 'progress': 50}])
+        self.assertEqual(UserProgress.objects.filter(student=self.student, chapter__course=course).count(), 3)
+        self.assertEqual(CourseStats.objects.get(course=course).completion_count, 2)
+        self.assertEqual(CourseStats.objects.get(course=course).completion_count,
+                         stats.compute([course.id])[course.id]['completion_count'])
+
+        response = self.client.post('/userprogress/batch/', [{'chapter_id': 0, 'is_completed': True}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RecommenderEngineTest(CourseTestCase):
+    TITLES = ['python web development', 'python data science', 'java web development', 'django web python',
+              'data science with r', 'machine learning python', 'web design basics', 'java spring boot',
+              'deep learning data', 'react web frontend', 'sql data basics', 'python testing tools']
+
+    def setUp(self):
+        super().setUp()
+        self.courses = [Course.objects.create(title=title, teacher=self.teacher, category=self.category, publish=True,
+                                              thumbnail='image/upload/sample.jpg') for title in self.TITLES]
+        self.engine = recommender.RecommenderEngine(k=3)
+        self.engine.rebuild()
+
+    def drain(self, engine=None):
+        # Chạy hàng đợi cập nhật ngay trên thread của test (không đóng kết nối DB của test)
+        with mock.patch.object(recommender, 'connection'):
+            (engine or self.engine)._drain()
+
+    def change_courses(self):
+        first, second = self.courses[:2]
+        Course.objects.filter(id=first.id).update(title='python web api development')
+        Course.objects.filter(id=second.id).update(publish=False)
+        new = Course.objects.create(title='data science python', teacher=self.teacher, category=self.category,
+                                    publish=True, thumbnail='image/upload/sample.jpg')
+        return [first.id, second.id, new.id]
+
+    def test_incremental_refresh_matches_full_index_build(self):
+        with mock.patch.object(recommender, 'REFIT_RATIO', 10):
+            snapshot = self.engine.refresh(self.change_courses())
+        self.assertEqual(snapshot.updates, 3)
+        self.assertEqual(snapshot.index.ids.tolist(),
+                         sorted(Course.objects.filter(publish=True).values_list('id', flat=True)))
+        # Cùng vector TF-IDF, danh sách hàng xóm phải giống hệt khi build lại toàn bộ index
+        full = TopKIndex.build(snapshot.index.ids, snapshot.matrix, k=snapshot.index.k)
+        np.testing.assert_allclose(snapshot.index.scores, full.scores, rtol=1e-5, atol=1e-6)
+        similarity = (snapshot.matrix @ snapshot.matrix.T).toarray()
+        for row, neighbors in enumerate(snapshot.index.neighbors):
+            for column, neighbor in enumerate(neighbors[neighbors >= 0]):
+                self.assertAlmostEqual(similarity[row, snapshot.index.row_of(neighbor)],
+                                       snapshot.index.scores[row, column], places=5)
+
+    def test_failed_refresh_keeps_snapshot_seq(self):
+        old_seq = self.engine.snapshot.seq
+        seq = recommender.publish_changes(self.change_courses())
+        with mock.patch.object(recommender.RecommenderEngine, '_start_worker', lambda engine: None):
+            with mock.patch.object(self.engine, 'refresh', side_effect=RuntimeError), \
+                    self.assertLogs('courses.recommender', 'ERROR'):
+                self.engine.sync(force=True)
+                self.drain()
+            self.assertEqual(self.engine.snapshot.seq, old_seq)
+
+            # Lần sync sau đọc lại nhật ký từ seq cũ
+            self.engine.sync(force=True)
+            self.drain()
+        self.assertEqual(self.engine.snapshot.seq, seq)
+        self.assertNotIn(self.courses[1].id, self.engine.snapshot.index)
+
+
+    def is_mapped(self, array):
+        # scipy bọc mảng memory-map thành view ndarray: tìm memmap trong chuỗi .base
+        while array is not None:
+            if isinstance(array, np.memmap):
+                return True
+            array = array.base
+        return False
+
+    def assert_same_neighbors(self, snapshot, expected):
+        self.assertEqual(snapshot.index.ids.tolist(), expected.index.ids.tolist())
+        for course_id in expected.index.ids:
+            ids, scores = snapshot.index.neighbors_of(course_id)
+            expected_ids, expected_scores = expected.index.neighbors_of(course_id)
+            np.testing.assert_array_equal(ids, expected_ids)
+            np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+    def test_artifacts_round_trip_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as root:
+            recommender.save_artifacts(self.engine.snapshot, root)
+            loaded = recommender.load_artifacts(root)
+            self.assertTrue(self.is_mapped(loaded.index.neighbors))
+            self.assertTrue(all(self.is_mapped(a) for a in (loaded.matrix.data, loaded.matrix.indices,
+                                                            loaded.matrix.indptr)))
+            self.assertEqual(loaded.seq, self.engine.snapshot.seq)
+            self.assert_same_neighbors(loaded, self.engine.snapshot)
+            # Vectorizer dựng lại từ từ vựng + idf (dùng khi cập nhật tăng dần) cho cùng vector
+            np.testing.assert_allclose(loaded.vectorizer.transform(['python web api']).toarray(),
+                                       self.engine.snapshot.vectorizer.transform(['python web api']).toarray())
+
+    def test_missing_or_stale_artifacts_fall_back_to_database(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(RECOMMENDER_ARTIFACTS_DIR=root), \
+                mock.patch.object(recommender.RecommenderEngine, '_start_worker', lambda engine: None):
+            # Chưa có artifact: build từ database
+            self.assertIsNone(recommender.load_artifacts())
+            self.assert_same_neighbors(recommender.RecommenderEngine(k=3).snapshot, self.engine.snapshot)
+
+            # Artifact định dạng khác: bỏ qua, build từ database
+            path = recommender.save_artifacts(self.engine.snapshot)
+            with open(os.path.join(path, 'manifest.json')) as f:
+                manifest = json.load(f)
+            with open(os.path.join(path, 'manifest.json'), 'w') as f:
+                json.dump({**manifest, 'format': recommender.ARTIFACT_FORMAT + 1}, f)
+            with self.assertLogs('courses.recommender', 'WARNING'):
+                engine = recommender.RecommenderEngine(k=3)
+                self.assertFalse(self.is_mapped(engine.snapshot.index.neighbors))
+            self.assert_same_neighbors(engine.snapshot, self.engine.snapshot)
+
+            # Artifact cũ hơn nhật ký thay đổi: áp dụng các thay đổi sau seq của artifact,
+            # nhật ký bị thiếu -> build lại toàn bộ
+            recommender.save_artifacts(self.engine.snapshot)
+            seq = recommender.publish_changes(self.change_courses())
+            for missing_log in (False, True):
+                if missing_log:
+                    cache.delete(recommender.CHANGE_KEY.format(seq))
+                engine = recommender.RecommenderEngine(k=3)
+                self.assertTrue(self.is_mapped(engine.snapshot.index.neighbors))
+                engine.sync(force=True)
+                self.drain(engine)
+                self.assertEqual(engine.snapshot.seq, seq)
+                self.assertEqual(engine.snapshot.index.ids.tolist(),
+                                 sorted(Course.objects.filter(publish=True).values_list('id', flat=True)))
+
+    def test_co_purchased_courses_rank_above_unrelated_ones(self):
+        java, react, sql, design = self.courses[7], self.courses[9], self.courses[10], self.courses[6]
+        qualification = self.student.user.qualification
+        students = [Student.objects.create(user=User.objects.create(username=f'buyer{i}', is_student=True,
+                                                                      qualification=qualification))
+                    for i in range(5)]
+        # java và react (không có từ chung) thường được mua cùng nhau, sql/design mua riêng
+        for student in students[:3]:
+            Purchase.objects.create(student=student, course=java)
+        for student in students[:2]:
+            Purchase.objects.create(student=student, course=react)
+        Rating.objects.create(student=students[2], course=react, rate=5)
+        for student in students[3:]:
+            Purchase.objects.create(student=student, course=sql)
+            Purchase.objects.create(student=student, course=design)
+
+        cf = collaborative.CollaborativeEngine(k=3)
+        cf.rebuild()
+        ids, scores = cf.neighbors_of(java.id)
+        self.assertEqual(ids.tolist(), [react.id])
+        self.assertGreater(scores[0], 0.9)
+        self.assertEqual(cf.neighbors_of(sql.id)[0].tolist(), [design.id])
+
+        with mock.patch.object(recommender, 'engine', self.engine), \
+                mock.patch.object(collaborative, 'engine', cf):
+            tfidf_only = recommender.ranked_neighbors(java.id, cf_weight=0).tolist()
+            blended = recommender.ranked_neighbors(java.id, cf_weight=0.5).tolist()
+        self.assertNotIn(react.id, tfidf_only)
+        # Khóa học hay được mua cùng đứng đầu, khóa học TF-IDF tương đồng (java web) vẫn còn,
+        # khóa học không liên quan không được gợi ý
+        self.assertEqual(blended[0], react.id)
+        self.assertIn(self.courses[2].id, blended)
+        self.assertNotIn(sql.id, blended)
+
+    def test_recommendation_cache_follows_student_interactions(self):
+        student_id = self.student.id
+        with mock.patch.object(recommender, 'engine', self.engine), \
+                mock.patch.object(recommender.collaborative, 'engine', mock.Mock()):
+            version = recommender.model_version(student_id)
+            recommender.cache_recommendations(student_id, 1, ['first'], version)
+            recommender.cache_recommendations(student_id, 2, ['second'], version)
+            self.assertEqual(recommender.get_cached_recommendations(student_id, 1, version), ['first'])
+            self.assertEqual(recommender.get_cached_recommendations(student_id, 2, version), ['second'])
+
+            # Request bắt đầu trước khi học viên mua khóa học, ghi kết quả sau khi cache đã bị hủy
+            started = recommender.model_version(student_id)
+            recommender.invalidate_student(student_id)
+            recommender.cache_recommendations(student_id, 3, ['stale'], started)
+            current = recommender.model_version(student_id)
+            self.assertNotEqual(current, started)
+            for product_id in (1, 2, 3):
+                self.assertIsNone(recommender.get_cached_recommendations(student_id, product_id, current))
+
+    def batch_recommend(self, product_ids):
+        # Engine của test thay cho engine toàn cục, collaborative filtering rỗng
+        with mock.patch.object(recommender, 'engine', self.engine), \
+                mock.patch.object(recommender.collaborative, 'engine',
+                                  mock.Mock(**{'neighbors_of.return_value': None, 'snapshot.seq': 0})), \
+                mock.patch.object(coldstart, 'ranker', coldstart.ColdStartRanker()):
+            return self.client.post('/recommend/batch_recommend/', {'product_ids': product_ids}, format='json')
+
+    def test_batch_recommend_without_interactions_uses_profile(self):
+        self.student.interesting_cate = 'Development'
+        self.student.save()
+        response = self.batch_recommend([])
+        self.assertEqual(response.status_code, 200)
+        published = {course.id for course in self.courses}
+        self.assertTrue(response.data)
+        self.assertLessEqual({course['id'] for course in response.data}, published)
+
+    def test_batch_recommend_skips_interacted_courses(self):
+        bought, rated, seed = self.courses[0], self.courses[3], self.courses[1]
+        Purchase.objects.create(student=self.student, course=bought)
+        Rating.objects.create(student=self.student, course=rated, rate=5)
+        for product_ids in ([seed.id], []):
+            ids = [course['id'] for course in self.batch_recommend(product_ids).data]
+            self.assertTrue(ids)
+            self.assertFalse({bought.id, rated.id, *product_ids} & set(ids))
+
+    def test_batch_recommend_seeds_from_latest_interactions(self):
+        old, recent = self.courses[2], self.courses[5]
+        Purchase.objects.create(student=self.student, course=old)
+        Purchase.objects.filter(course=old).update(update_date='2020-01-01')
+        Rating.objects.create(student=self.student, course=recent, rate=4)
+        self.assertEqual(recommender.interacted_course_ids(self.student), [recent.id, old.id])
+
+        with override_settings(RECOMMENDER_BATCH_MAX_SEEDS=1), \
+                mock.patch.object(recommender, 'ranked_for_seeds', wraps=recommender.ranked_for_seeds) as ranked:
+            self.assertEqual(self.batch_recommend([]).status_code, 200)
+        self.assertEqual(ranked.call_args.args[0], [recent.id])
+
+    def test_batch_recommend_rejects_too_many_seeds(self):
+        with override_settings(RECOMMENDER_BATCH_MAX_SEEDS=2):
+            response = self.batch_recommend([c.id for c in self.courses[:3]])
+        self.assertEqual(response.status_code, 400)
+
+class SimilarityTest(SimpleTestCase):
+    def clustered_matrix(self, n=400, d=200, clusters=20):
+        # Các dòng cùng cụm gần nhau: top-k chính xác có cấu trúc rõ ràng để đo recall
+        rng = np.random.default_rng(1)
+        centers = rng.random((clusters, d)) * (rng.random((clusters, d)) < 0.05)
+        rows = centers[np.arange(n) % clusters] + (rng.random((n, d)) < 0.02) * rng.random((n, d)) * 0.5
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+        return sparse.csr_matrix(rows.astype(np.float32)), np.arange(n, dtype=np.int64) * 3 + 1
+
+    def test_lsh_recall_and_determinism(self):
+        matrix, ids = self.clustered_matrix()
+        exact, _ = exact_neighbors(matrix, matrix, ids, 10, self_cols=np.arange(len(ids)))
+        approx, scores = lsh_neighbors(matrix, ids, 10, tables=4, bits=8, block=64)
+        recall = np.mean([len(set(a[a >= 0]) & set(e[e >= 0])) / len(e[e >= 0]) for a, e in zip(approx, exact)])
+        self.assertGreater(recall, 0.9)
+        # Điểm của ứng viên LSH là cosine chính xác, giảm dần, không chứa chính nó
+        self.assertTrue((np.diff(scores, axis=1) <= 1e-6).all())
+        self.assertFalse((approx == ids[:, None]).any())
+
+        again, again_scores = lsh_neighbors(matrix, ids, 10, tables=4, bits=8, block=64)
+        np.testing.assert_array_equal(approx, again)
+        np.testing.assert_array_equal(scores, again_scores)
+
+    def test_invalid_ann_parameters(self):
+        matrix, ids = self.clustered_matrix(n=20)
+        for params in ({'block': 1}, {'block': 0}, {'tables': 0}, {'bits': 0}, {'bits': 64}):
+            with self.assertRaises(ValueError):
+                lsh_neighbors(matrix, ids, 10, **params)
+        with self.assertRaises(ValueError):
+            TopKIndex.build(ids, matrix, k=0, ann={'block': 64})
+        with self.assertRaises(ValueError):
+            TopKIndex.build(ids, matrix, k=0)
+        self.assertEqual(TopKIndex.build(ids, matrix, k=3, ann={'block': 2}).k, 3)
+
+
+class SearchIndexTest(CourseTestCase):
+    def document(self, title, category='Development', chapters=''):
+        return {'title': title, 'search_key': fold(title), 'category': category, 'chapter': fold(chapters)}
+
+    def test_folded_prefix_typo_and_all_terms_matching(self):
+        index = search.InvertedIndex()
+        index.add(1, self.document('Lập trình Python cơ bản', chapters='Biến và kiểu dữ liệu'))
+        index.add(2, self.document('Java nâng cao'))
+        index.add(3, self.document('Thiết kế web', category='Design'))
+
+        def ids(query):
+            return [course_id for course_id, _ in index.search(query)]
+
+        self.assertEqual(ids('lap trinh'), [1])
+        self.assertEqual(ids('LẬP TRÌNH'), [1])
+        self.assertEqual(ids('pyth'), [1])
+        self.assertEqual(ids('pytohn'), [1])
+        self.assertEqual(ids('kieu du lieu'), [1])
+        self.assertEqual(ids('design'), [3])
+        # Mọi từ phải xuất hiện
+        self.assertEqual(ids('python java'), [])
+        self.assertEqual(ids('java nang cao'), [2])
+
+        index.add(1, self.document('Lập trình Java'))
+        self.assertEqual(ids('python'), [])
+        self.assertEqual(sorted(ids('java')), [1, 2])
+        index.remove(2)
+        self.assertEqual(ids('java'), [1])
+
+    def test_filtered_queryset_is_ranked_before_limiting(self):
+        other_user = User.objects.create(username='teacher2', is_teacher=True,
+                                         qualification=self.teacher.user.qualification)
+        other = Teacher.objects.create(user=other_user)
+        n = search.MAX_RESULTS + 100
+        Course.objects.bulk_create([
+            Course(title=f'Python {i}', teacher=self.teacher, category=self.category, publish=True,
+                   search_key=fold(f'Python {i} python')) for i in range(n)])
+        Course.objects.create(title='Python for teacher two', teacher=other, category=self.category, publish=True)
+
+        backend = search.InvertedIndexBackend()
+        results = backend.search(Course.objects.filter(teacher=other), 'python')
+        self.assertEqual([c.title for c in results], ['Python for teacher two'])
+        # Số kết quả giới hạn ở MAX_RESULTS kết quả liên quan nhất
+        self.assertEqual(backend.search(Course.objects.all(), 'python').count(), search.MAX_RESULTS)
+        # Kết quả liên quan nhất (python xuất hiện 2 lần) đứng trước
+        ranked = backend.search(Course.objects.filter(publish=True), 'python')
+        self.assertEqual(ranked[0].teacher_id, self.teacher.id)
+        with mock.patch.object(search, 'MAX_RESULTS', n + 1):
+            ranked = backend.search(Course.objects.filter(publish=True), 'python')
+            self.assertEqual(ranked.count(), n + 1)
+            self.assertEqual(ranked[n].title, 'Python for teacher two')
+
+    def test_index_copy_leaves_original_unchanged(self):
+        index = search.InvertedIndex()
+        index.add(1, self.document('Python cơ bản'))
+        index.add(2, self.document('Python nâng cao'))
+        before, typo = index.search('python'), index.search('pytohn')
+
+        updated = index.copy()
+        updated.remove(1)
+        updated.add(2, self.document('Java nâng cao'))
+        updated.add(3, self.document('Python web'))
+        self.assertEqual(index.search('python'), before)
+        self.assertEqual(index.search('pytohn'), typo)
+        self.assertEqual([course_id for course_id, _ in updated.search('python')], [3])
+        self.assertEqual([course_id for course_id, _ in updated.search('java')], [2])
+        self.assertEqual(index.search('java'), [])
+
+    def test_mysql_backend_requires_trigram_ngram_size(self):
+        backend = search.MySQLFulltextBackend()
+        with mock.patch.object(search, 'connection') as db:
+            cursor = db.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = (2,)
+            with self.assertRaises(ImproperlyConfigured):
+                backend.search(Course.objects.all(), 'python')
+            cursor.fetchone.return_value = (3,)
+            backend.check_server()
+        self.assertTrue(backend.checked)
+
+
+class ColdStartModelTest(CourseTestCase):
+    def test_update_from_change_log_matches_full_build(self):
+        courses = [Course.objects.create(title=title, description=description, teacher=self.teacher,
+                                         category=self.category, publish=True)
+                   for title, description in [('Python cơ bản', 'Cho học sinh lớp 10'), ('Java nâng cao', None),
+                                              ('SQL', 'Dành cho sinh viên'), ('Docker', 'Chuyên sâu')]]
+        ranker = coldstart.ColdStartRanker()
+        model = ranker.model(coldstart.version())
+
+        Course.objects.filter(id=courses[0].id).update(title='Python nâng cao')
+        Course.objects.filter(id=courses[1].id).update(publish=False)
+        new = Course.objects.create(title='Go cơ bản', teacher=self.teacher, category=self.category, publish=True)
+        recommender.publish_changes([courses[0].id, courses[1].id, new.id])
+
+        # Request vẫn dùng model cũ, cập nhật chạy ở thread nền
+        with mock.patch.object(coldstart.threading, 'Thread') as thread:
+            self.assertIs(ranker.model(coldstart.version()), model)
+        thread.return_value.start.assert_called_once()
+        with mock.patch.object(coldstart.ColdStartModel, 'build', side_effect=AssertionError):
+            updated = ranker.update(coldstart.version())
+        full = coldstart.ColdStartModel.build(coldstart.version())
+        self.assertEqual(updated.version, full.version)
+        self.assertEqual(updated.ids.tolist(), full.ids.tolist())
+        self.assertEqual((updated.features != full.features).nnz, 0)
+        level = coldstart.LEVEL_NAMES.index(fold('thạc sĩ'))
+        self.assertEqual(updated.rank([self.category.title], level, 10), [courses[0].id, courses[3].id, courses[2].id, new.id])
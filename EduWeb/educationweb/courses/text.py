@@ -0,0 +1,33 @@
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def fold(text):
+    # Bỏ dấu tiếng Việt và chuyển về chữ thường: "Sinh Viên Đại học" -> "sinh vien dai hoc"
+    text = unicodedata.normalize('NFD', (text or '').replace('đ', 'd').replace('Đ', 'D'))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(fold(text))
+
+
+def trigrams(token):
+    # Thêm khoảng trắng 2 đầu để từ ngắn vẫn có trigram và khớp đầu/cuối từ được ưu tiên
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    # Khoảng cách Damerau-Levenshtein (thêm/xóa/thay/đổi chỗ 2 ký tự liền nhau)
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
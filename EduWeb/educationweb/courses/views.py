@@ -1,4 +1,4 @@
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, generics, parsers, permissions, status
 from .models import (Category, Course, Teacher, User,
                      Exam, Chapter, Student, UserProgress,
@@ -7,6 +7,7 @@ from .models import (Category, Course, Teacher, User,
                      StudentExam, StudentAnswer, Qualification)
 from rest_framework.response import Response
 from courses import serializers, paginators, perms
+from courses import recommender, coldstart, services, search, autocomplete, course_cache, response_cache, conditional, exports, importer, progress
 from rest_framework.decorators import action
 import stripe
 from django.views.decorators.csrf import csrf_exempt
@@ -15,26 +16,23 @@ from google.auth.transport import requests
 from google.oauth2 import id_token
 from .dao import (generate_system_token_for_user, send_activation_email,
                   calculate_review, calculate_student, calculate_average_review, get_analytics,
+                  revenue_series, REVENUE_PERIODS,
                   is_all_chapter_completed, extract_video_id, send_payment_success_email)
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib.auth import get_user_model
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-import google.generativeai as genai
 from decouple import config
 from django.core.cache import cache
 from django.views.decorators.cache import cache_page
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.core.files.storage import default_storage
+import io
 import os
 import cloudinary
 from django.utils import timezone
+from datetime import date
 import logging
 logger = logging.getLogger(__name__)
-from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound
 from django.conf import settings
 
 
@@ -98,10 +96,10 @@ class TeacherViewSet(viewsets.ModelViewSet, viewsets.GenericViewSet):
     @action(methods=['get'], detail=False)
     def get_courses(self, request):
         teacher = Teacher.objects.get(user=request.user)
-        courses = Course.objects.filter(teacher_id=teacher.id).order_by('id')
+        courses = Course.objects.filter(teacher_id=teacher.id).select_related('category', 'teacher__user').order_by('id')
         q = request.query_params.get("q")
         if q:
-            courses = courses.filter(title__icontains=q)
+            courses = search.search(courses, q)
         page = self.paginate_queryset(courses)
         if page is not None:
             serializer = serializers.CourseSerializer(page, many=True, context={'request': request})
@@ -112,7 +110,20 @@ class TeacherViewSet(viewsets.ModelViewSet, viewsets.GenericViewSet):
     @action(methods=['get'], detail=False)
     def analytics(self, request):
         teacher = Teacher.objects.get(user=request.user)
-        analytics_data = get_analytics(teacher.user.id)
+        # ?start=&end= (YYYY-MM-DD) lọc theo ngày mua, ?period=day|week|month thêm chuỗi doanh thu
+        try:
+            start, end = [date.fromisoformat(request.query_params[p]) if request.query_params.get(p) else None
+                          for p in ('start', 'end')]
+        except ValueError:
+            return Response({'error': 'start/end phải có dạng YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if start and end and start > end:
+            return Response({'error': 'start phải trước hoặc bằng end'}, status=status.HTTP_400_BAD_REQUEST)
+        period = request.query_params.get('period')
+        if period and period not in REVENUE_PERIODS:
+            return Response({'error': 'period phải là day, week hoặc month'}, status=status.HTTP_400_BAD_REQUEST)
+        analytics_data = get_analytics(teacher.user.id, start, end)
+        if period:
+            analytics_data['series'] = revenue_series(teacher.user.id, period, start, end)
         return Response(analytics_data, status=status.HTTP_200_OK)
 
     @action(methods=['patch'], detail=False)
@@ -163,37 +174,36 @@ class UserCourseViewSet(viewsets.ViewSet, generics.ListAPIView):
 
     def get_queryset(self):
         queryset = Course.objects.filter(publish=True).all()
-        q = self.request.query_params.get("q")
-        if q:
-            queryset = queryset.filter(title__icontains=q)
         cate_id = self.request.query_params.get('category_id')
         if cate_id:
             queryset = queryset.filter(category_id=cate_id)
         queryset = queryset.order_by('id')
+        q = self.request.query_params.get("q")
+        if q:
+            # Sắp xếp theo độ liên quan
+            queryset = search.search(queryset, q)
         return queryset
 
+    @response_cache.cache_list_response([Course, Category, Chapter])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     @action(methods=['get'], detail=False)
     def export_csv(self, request):
-        import pandas as pd
-        from django.http import HttpResponse
-
-        courses = Course.objects.filter(publish=True).values(
-            'id', 'title', 'category__title', 'price'
-        )
-
-        df = pd.DataFrame(courses)
-
-        # Lấy base URL của frontend từ settings
-        base_url = settings.FRONTEND_BASE_URL  # vd: http://localhost:3000
-
-        # Tạo link FE đến khóa học
-        df['link'] = df['id'].apply(lambda x: f"{base_url}/stuwall/course/{x}")
-
-        # Export
-        response = HttpResponse(content_type='text/csv')
+        # Ghi từng đợt khóa học vào response (stream), không giữ cả danh sách trong bộ nhớ
+        response = StreamingHttpResponse(exports.csv_stream(Course.objects.filter(publish=True)),
+                                         content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="coursesAI.csv"'
-        df.to_csv(path_or_buf=response, index=False)
+        return response
 
+    @action(methods=['get'], detail=False)
+    def export_parquet(self, request):
+        # Định dạng cột cho các job phân tích, cần cài pyarrow
+        if not exports.parquet_available():
+            return Response({'error': 'Chưa cài pyarrow'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        response = StreamingHttpResponse(exports.parquet_stream(Course.objects.filter(publish=True)),
+                                         content_type='application/vnd.apache.parquet')
+        response['Content-Disposition'] = 'attachment; filename="coursesAI.parquet"'
         return response
 
 
@@ -201,33 +211,9 @@ class CategoryViewSet(viewsets.ViewSet, generics.ListAPIView, generics.CreateAPI
     queryset = Category.objects.all()
     serializer_class = serializers.CategorySerializer
 
-    # def get_queryset(self):
-    #     # Tạo cache key cho danh sách danh mục
-    #     cache_key = "category_list"
-    #
-    #     # Kiểm tra cache
-    #     cached_queryset = cache.get(cache_key)
-    #     if cached_queryset is not None:
-    #         print(f"Cache hit for {cache_key}")
-    #         return cached_queryset
-    #
-    #     # Nếu không có trong cache, truy vấn database
-    #     print(f"Cache miss for {cache_key}")
-    #     queryset = Category.objects.all()
-    #
-    #     # Lưu vào cache với timeout (ví dụ: 24 giờ vì danh mục ít thay đổi)
-    #     cache.set(cache_key, queryset, timeout=86400)
-    #     return queryset
-    #
-    # def create(self, request, *args, **kwargs):
-    #     # Tạo danh mục mới
-    #     response = super().create(request, *args, **kwargs)
-    #
-    #     # Xóa cache khi danh mục mới được tạo
-    #     cache.delete("category_list")
-    #     logger.info("Cache invalidated for category_list after create")
-    #
-    #     return response
+    @response_cache.cache_list_response([Category])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
 
 class CourseViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIView):
@@ -236,49 +222,35 @@ class CourseViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPI
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Course.objects.all()
+        queryset = Course.objects.select_related('category', 'teacher__user')
         if self.action == 'list':
             if not self.request.query_params.get('create_chapter'):
                 queryset = queryset.filter(publish=True)
 
-        q = self.request.query_params.get("q")
-        if q:
-            queryset = queryset.filter(title__icontains=q)
-
         cate_id = self.request.query_params.get('category_id')
         if cate_id:
             queryset = queryset.filter(category_id=cate_id).order_by('id')
 
-        return queryset
-    # def get_queryset(self):
-    #     # Tạo cache key dựa trên query params để đảm bảo tính duy nhất
-    #     q = self.request.query_params.get("q", "")
-    #     cate_id = self.request.query_params.get("category_id", "")
-    #     create_chapter = self.request.query_params.get("create_chapter", "")
-    #     cache_key = f"course_list:q={q}:cate={cate_id}:create_chapter={create_chapter}"
-    #
-    #     # Kiểm tra cache
-    #     cached_queryset = cache.get(cache_key)
-    #     if cached_queryset is not None:
-    #         return cached_queryset
-    #
-    #     # Nếu không có trong cache, truy vấn database
-    #     queryset = Course.objects.all()
-    #     if self.action == 'list':
-    #         if not create_chapter:
-    #             queryset = queryset.filter(publish=True)
-    #
-    #     if q:
-    #         queryset = queryset.filter(title__icontains=q)
-    #
-    #     if cate_id:
-    #         queryset = queryset.filter(category_id=cate_id).order_by('id')
-    #
-    #     # Lưu vào cache với timeout (ví dụ: 1 giờ)
-    #     cache.set(cache_key, queryset, timeout=3600)
-    #     return queryset
+        q = self.request.query_params.get("q")
+        if q:
+            # Sắp xếp theo độ liên quan
+            queryset = search.search(queryset, q)
 
+        return queryset
 
+    @action(methods=['get'], detail=False)
+    def autocomplete(self, request):
+        # Gợi ý khi gõ: chỉ trả về id, title, thumbnail từ index tiền tố (không truy vấn DB)
+        q = request.query_params.get('q', '')
+        limit = request.query_params.get('limit', '8')
+        if not limit.isdigit():
+            return Response({'error': 'limit không hợp lệ'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(autocomplete.complete(q, int(limit)), status=status.HTTP_200_OK)
+
+    # Có dữ liệu riêng của học viên (đã mua, tiến độ) -> cache theo từng người dùng
+    @response_cache.cache_list_response([Course, Category, Chapter, Exam, Question, Answer, Teacher], per_user=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
         request.query_params = request.query_params.copy()
@@ -286,20 +258,41 @@ class CourseViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPI
         return super().create(request, *args, **kwargs)
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance, context={'request': request})
-        return Response(serializer.data)
+        # Phần công khai lấy từ cache theo (id, version), chỉ tính phần riêng của người dùng
+        if not str(kwargs['pk']).isdigit():
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+        course_id = int(kwargs['pk'])
+        # Client đã có bản mới nhất (version khóa học và version dữ liệu riêng của người dùng) -> 304
+        (current, _), etag, modified, not_modified = conditional.evaluate(
+            request, [course_cache.VERSION_KEY.format(course_id), response_cache.USER_GENERATION_KEY.format(request.user.id)],
+            'course', course_id, request.user.id)
+        if not_modified is not None:
+            return not_modified
+        data = course_cache.public_payload(course_id, request, current)
+        if data is None:
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+        chapter_ids = [chapter['id'] for chapter in data['chapters']]
+        response = Response({**data, **serializers.CourseSerializer.user_overlay(data['id'], chapter_ids, request.user)})
+        patch_vary_headers(response, ['Authorization'])
+        return conditional.set_headers(response, etag, modified)
 
 
     @action(methods=['get'], detail=True)
     def get_chapter(self, request, pk):
+        if not str(pk).isdigit():
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+        # Danh sách chương thay đổi -> version khóa học tăng (course_cache)
+        _, etag, modified, not_modified = conditional.evaluate(
+            request, [course_cache.VERSION_KEY.format(pk)], 'chapters', pk)
+        if not_modified is not None:
+            return not_modified
         try:
             course = Course.objects.get(pk=pk)
         except Course.DoesNotExist:
             return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
         chapters = course.chapters.all()
-        return Response(serializers.ChapterSerializer(chapters, many=True).data,
-                        status=status.HTTP_200_OK)
+        return conditional.set_headers(Response(serializers.ChapterSerializer(chapters, many=True).data,
+                                                status=status.HTTP_200_OK), etag, modified)
     # def get_chapter(self, request, pk):
     #     try:
     #         course = Course.objects.get(pk=pk)
@@ -340,6 +333,28 @@ class CourseViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPI
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializers.CourseSerializer(status=status.HTTP_400_BAD_REQUEST))
 
+    @action(methods=['post'], detail=False, url_path='import', permission_classes=[permissions.IsAdminUser],
+            parser_classes=[parsers.MultiPartParser])
+    def import_courses(self, request):
+        # Nhập hàng loạt từ file CSV/JSONL (định dạng: xem courses/importer.py), chỉ dành cho admin
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Thiếu file'}, status=status.HTTP_400_BAD_REQUEST)
+        teacher = None
+        if request.data.get('teacher'):
+            teacher = Teacher.objects.filter(user__username=request.data.get('teacher')).first()
+            if teacher is None:
+                return Response({'error': 'Không có giáo viên này'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or importer.format_of(upload.name)
+        try:
+            courses, errors = importer.parse(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                                             file_format)
+        except (ValueError, UnicodeDecodeError) as ex:
+            return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        result = importer.run_import(courses, teacher)
+        result['errors'] = errors + result['errors']
+        return Response(result, status=status.HTTP_201_CREATED if result['courses'] else status.HTTP_400_BAD_REQUEST)
+
     @action(methods=['patch'], detail=True,
             permission_classes=[permissions.IsAuthenticated, perms.IsTeacher])
     def update_course(self, request, pk=None):
@@ -443,58 +458,65 @@ class ChapterViewSet(viewsets.ViewSet):
         serializer.save(position=max_position + 1)
 
     def retrieve(self, request, pk=None):
+        # Trang xem video: khóa học và danh sách chương lấy từ cache (course_cache), chương hiện tại và
+        # chương tiếp theo tìm trong danh sách đó -> số truy vấn cố định, không phụ thuộc số chương
         try:
             user = request.user
             user_id = user.id
             course_id = request.query_params.get('course_id')
-            chapter_id = pk
+            chapter_id = int(pk) if str(pk).isdigit() else None
 
             is_student = hasattr(user, 'student')
             is_teacher = hasattr(user, 'teacher')
 
-            course = Course.objects.filter(id=course_id).first()
-            chapter = Chapter.objects.filter(id=chapter_id).first()
+            course = course_cache.public_payload(int(course_id), request) \
+                if course_id and str(course_id).isdigit() else None
+            chapters = sorted(course['chapters'], key=lambda c: c['position']) if course else []
+            chapter = next((c for c in chapters if c['id'] == chapter_id), None)
+            if chapter is None and chapter_id is not None:
+                # Chương không thuộc khóa học course_id
+                chapter = Chapter.objects.filter(id=chapter_id).first()
+                chapter = serializers.ChapterSerializer(chapter).data if chapter else None
+            if course:
+                chapter_ids = [c['id'] for c in chapters]
+                course = {**course, **serializers.CourseSerializer.user_overlay(course['id'], chapter_ids, user)}
             purchase = None
             user_progress = None
 
             if is_student:
-                try:
-                    purchase = Purchase.objects.get(student__user_id=user_id, course_id=course_id)
-                except Purchase.DoesNotExist:
-                    purchase = None
+                purchase = Purchase.objects.filter(student__user_id=user_id, course_id=course_id).first() \
+                    if course else None
 
                 if chapter:
-                    if not chapter.is_free and not purchase:
+                    if not chapter['is_free'] and not purchase:
                         return Response({"chapter": None}, status=status.HTTP_200_OK)
 
                     user_progress = UserProgress.objects.filter(student__user_id=user_id, chapter_id=chapter_id).first()
 
-            next_chapter = Chapter.objects.filter(
-                course_id=course_id,
-                position__gt=chapter.position
-            ).order_by('position').first() if chapter else None
+            next_chapter = next((c for c in chapters if c['position'] > chapter['position']), None) \
+                if chapter else None
 
             if is_teacher:
+                video = Chapter.objects.filter(id=chapter_id).values_list('video', flat=True).first() \
+                    if chapter else None
                 chapter_data = {
-                    'id': chapter.id,
-                    'title': chapter.title,
-                    'description': chapter.description,
-                    'position': chapter.position,
-                    'is_free': chapter.is_free,
-                    'video': chapter.video if chapter.video else None,
+                    'id': chapter['id'],
+                    'title': chapter['title'],
+                    'description': chapter['description'],
+                    'position': chapter['position'],
+                    'is_free': chapter['is_free'],
+                    'video': video if video else None,
                 } if chapter else None
 
                 response_data = {
                     'chapter': chapter_data,
-                    'course': serializers.CourseSerializer(course,
-                                                           context={'request': request}).data if course else None
+                    'course': course
                 }
             elif is_student:
                 response_data = {
-                    'chapter': serializers.ChapterSerializer(chapter).data if chapter else None,
-                    'course': serializers.CourseSerializer(course,
-                                                           context={'request': request}).data if course else None,
-                    'nextChapter': serializers.ChapterSerializer(next_chapter).data if next_chapter else None,
+                    'chapter': chapter,
+                    'course': course,
+                    'nextChapter': next_chapter,
                     'userProgress': serializers.UserProgressSerializer(user_progress).data if user_progress else None,
                     'purchase': serializers.PurchaseSerializer(purchase).data if purchase else None,
                 }
@@ -573,11 +595,15 @@ class ChapterViewSet(viewsets.ViewSet):
 
     @action(methods=['get'], detail=True)
     def get_question(self, request, pk):
+        _, etag, modified, not_modified = conditional.evaluate(
+            request, [conditional.QUIZ_VERSION_KEY.format(pk)], 'quiz', pk)
+        if not_modified is not None:
+            return not_modified
         l = self.get_object()
-        return Response(
-            serializers.QuizQuestionSerializer(l.quiz_questions.order_by("-id").all(), many=True,
+        return conditional.set_headers(Response(
+            serializers.QuizQuestionSerializer(l.quiz_questions.order_by("-id").prefetch_related('answers'), many=True,
                                                context={"request": self.request}).data,
-            status=status.HTTP_200_OK)
+            status=status.HTTP_200_OK), etag, modified)
 
 
 class StudentViewSet(viewsets.ViewSet, generics.ListAPIView):
@@ -587,7 +613,7 @@ class StudentViewSet(viewsets.ViewSet, generics.ListAPIView):
     @action(methods=['get'], detail=False, permission_classes=[permissions.IsAuthenticated])
     def get_courses(self, request):
         student = Student.objects.get(user=request.user)
-        purchased_courses = Course.objects.filter(purchase__student_id=student.id)
+        purchased_courses = Course.objects.filter(purchase__student_id=student.id).select_related('category', 'teacher__user')
         serializer = serializers.CourseSerializer(purchased_courses, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -606,8 +632,9 @@ class StudentViewSet(viewsets.ViewSet, generics.ListAPIView):
     @action(methods=['get'], detail=False, permission_classes=[permissions.IsAuthenticated])
     def teacher_course(self, request):
         teacher = request.query_params.get('teacher_id')
-        course = Course.objects.filter(teacher_id=teacher).annotate(chapter=Count('chapters'))
+        course = Course.objects.filter(teacher_id=teacher).select_related('category', 'stats')
         for c in course:
+            c.chapter = c.stats.chapter_count if hasattr(c, 'stats') else 0
             c.review = calculate_average_review(c)
         serializer = serializers.TeacherCourseSerializer(course, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -665,6 +692,25 @@ class UserProgressViewSet(viewsets.ViewSet):
         return Response(serializers.UserProgressSerializer(user_progress, context={"request": request}).data,
                         status=status.HTTP_201_CREATED)
 
+    @action(methods=['post'], detail=False, url_path='batch')
+    def batch_update(self, request):
+        # Body: [{"chapter_id": 1, "is_completed": true}, ...], cùng chương thì lấy giá trị sau cùng
+        if not hasattr(request.user, 'student'):
+            return Response({'error': 'Chỉ học viên mới cập nhật tiến độ'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = serializers.ProgressItemSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data:
+            return Response({'error': 'Danh sách chương trống'}, status=status.HTTP_400_BAD_REQUEST)
+        items = {item['chapter_id']: item['is_completed'] for item in serializer.validated_data}
+        try:
+            course_progress = progress.save_batch(request.user, items)
+        except ValueError as ex:
+            return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'updated': len(items),
+            'courses': [{'course_id': course_id, 'progress': value} for course_id, value in course_progress.items()],
+        }, status=status.HTTP_200_OK)
+
 
 class NoteViewSet(viewsets.ModelViewSet):
     queryset = Note.objects.all()
@@ -840,8 +886,6 @@ class PurchaseViewSet(viewsets.ModelViewSet):
 
 
 class GeminiChatViewSet(viewsets.GenericViewSet):
-    genai.configure(api_key=config('GEMINI_API_KEY'))
-
     @action(methods=['POST'], detail=False, url_path='chatgemini', serializer_class=serializers.GeminiChatSerializer)
     def chat_gemini(self, request):
         #serializers dữ liệu đầu vào
@@ -856,13 +900,8 @@ class GeminiChatViewSet(viewsets.GenericViewSet):
 
 
         if video_id:
-            try:
-                # Dùng YouTubeTranscriptApi để lấy transcript từ video(nếu có)
-                transcript = YouTubeTranscriptApi.get_transcript(video_id)
-                # gộp lại thành file text
-                transcript_text = " ".join([entry['text'] for entry in transcript])
-            except (TranscriptsDisabled, NoTranscriptFound):
-                transcript_text = ""
+            # Lấy transcript từ video(nếu có), gộp lại thành text
+            transcript_text = services.transcripts.fetch(video_id)
 
         #Tạo prompt gửi đến Gemini
         prompt = (
@@ -874,21 +913,7 @@ class GeminiChatViewSet(viewsets.GenericViewSet):
             f"Keep the answer concise (3–5 sentences)."
         )
 
-        model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 500,
-                "response_mime_type": "text/plain",
-            },
-        )
-
-        chat = model.start_chat(history=[])
-        response = chat.send_message(prompt)
-
-        return Response({"response": response.text}, status=status.HTTP_200_OK)
+        return Response({"response": services.gemini.ask(prompt)}, status=status.HTTP_200_OK)
         # serializer = self.get_serializer(data=request.data)
         # if not serializer.is_valid():
         #     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -956,25 +981,6 @@ def handle_checkout_session(session):
     )
 
 
-products_df = pd.read_csv('courses.csv')
-
-print(products_df)
-
-# Xây dựng vector đặc trưng TF-IDF từ tên sản phẩm, stop_words='english': loại bỏ các từ thông dụng: the, and of
-tfidf_vectorizer = TfidfVectorizer(stop_words='english', norm='l2')
-# Ma trận có x kích thước
-tfidf_matrix = tfidf_vectorizer.fit_transform(products_df['title'])
-print("Ma trận TF-IDF (đã chuyển thành dạng array):")
-print(tfidf_matrix.toarray())
-
-# Sử dụng cosine similarity để tính độ tương tự giữa các sản phẩm,
-# kết quả là 1 ma trận vuông, consine_sim[i][j] thể hiện mức độ tương đồng giữa [i] và [j]
-cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-print("\nMa trận Cosine Similarity (5 sản phẩm đầu tiên):")
-print(cosine_sim[:5, :5])  # In ra ma trận tương tự cho 5 sản phẩm đầu tiên
-
-
-
 class RecommenViewset(viewsets.ViewSet, generics.ListAPIView):
     serializer_class = serializers.UserCourseSerializer
     pagination_class = paginators.RecommendCoursePaginator
@@ -996,81 +1002,92 @@ class RecommenViewset(viewsets.ViewSet, generics.ListAPIView):
 
             product_id = int(product_id)
 
-            # === [1] Lấy index TF-IDF ===
-            # Lấy vị trí khóa học trong data frame và tính độ tương đồng(dùng để tra IF-IDF)
-            product_index = products_df[products_df['id'] == product_id].index
-            if product_index.empty:
+            # === [0] Kết quả đã cache cho (học viên, khóa học) ===
+            version = recommender.model_version(student.id)
+            cached = recommender.get_cached_recommendations(student.id, product_id, version)
+            if cached is not None:
+                return Response(cached)
+
+            # === [1] + [2] Lấy các khóa học tương đồng (TF-IDF + collaborative filtering, đã sắp xếp, loại bỏ chính nó) ===
+            ranked_ids = recommender.ranked_neighbors(product_id)
+            if ranked_ids is None:
                 return Response({'error': 'Không tìm thấy khóa học'}, status=status.HTTP_404_NOT_FOUND)
-            product_index = product_index[0]
-
-            # === [2] Tính độ tương đồng TF-IDF ===
-            # Dựa vào consine sim, tìm khóa học có độ tương đồng cao nhất với product_id
-            similar_scores = list(enumerate(cosine_sim[product_index]))
-            similar_scores = sorted(similar_scores, key=lambda x: x[1], reverse=True)
-            # Loại bỏ chính nó (product_id) ra khỏi danh sách
-            similar_scores = [score for score in similar_scores if
-                              score[1] > 0 and products_df.iloc[score[0]]['id'] != product_id]
-            # lưu dsach khóa học vào recommended_ids_by_tfidf
-            recommended_ids_by_tfidf = [int(products_df.iloc[i[0]]['id']) for i in similar_scores]
-
-            # === [3] Lấy các khóa học đã tương tác (mua, đánh giá, bình luận)
-            purchased_ids = Purchase.objects.filter(student=student).values_list('course_id', flat=True)
-            rated_ids = Rating.objects.filter(student=student).values_list('course_id', flat=True)
-            commented_ids = Comment.objects.filter(student=student).values_list('course_id', flat=True)
-            # Hợp nhất lại thành interacted_ids, tránh các khóa học đã xem rồi
-            interacted_ids = set(purchased_ids) | set(rated_ids) | set(commented_ids)
+            # lưu dsach khóa học vào recommended_ids_by_score
+            recommended_ids_by_score = ranked_ids.tolist()
+
+            # === [3] Lấy các khóa học đã tương tác (mua, đánh giá, bình luận), tránh các khóa học đã xem rồi
+            interacted_ids = set(recommender.interacted_course_ids(student))
 
             # === [4] Gợi ý khóa học
             recommended_ids = []
 
             if interacted_ids:
-                # === [4.1] Ưu tiên khóa học TF-IDF(đã đưa vào) nhưng chưa tương tác
-                for course_id in recommended_ids_by_tfidf:
+                # === [4.1] Ưu tiên khóa học có điểm cao nhất nhưng chưa tương tác
+                for course_id in recommended_ids_by_score:
                     if course_id not in interacted_ids:
                         recommended_ids.append(course_id)
                     if len(recommended_ids) >= 10: #lấy tối đa 10 khóa học
                         break
             else:
-                # === [4.2] Nếu user chưa tương tác: gợi ý theo thông tin hồ sơ
-                cate_filter = Q()
-                if student.interesting_cate:
-                    cate_titles = [title.strip() for title in student.interesting_cate.split(',')]
-                    cate_filter |= Q(category__title__in=cate_titles)
-
-                level_filter = Q()
-                if user.qualification:
-                    q = user.qualification.lower()
-                    if "sinh viên" in q:
-                        level_filter |= Q(title__icontains="sinh viên") | Q(description__icontains="sinh viên")
-                    elif "học sinh" in q:
-                        level_filter |= Q(title__icontains="cơ bản") | Q(description__icontains="lớp")
-                    elif "thạc sĩ" in q:
-                        level_filter |= Q(title__icontains="nâng cao") | Q(description__icontains="chuyên sâu")
-
-                fallback_courses = Course.objects.filter(cate_filter | level_filter).distinct()[:10]
-                recommended_ids = [c.id for c in fallback_courses]
+                # === [4.2] Nếu user chưa tương tác: gợi ý theo thông tin hồ sơ (danh mục quan tâm, trình độ)
+                recommended_ids = coldstart.ranker.recommend(student.interesting_cate, user.qualification)
 
             # === [5] DEBUG LOG cho báo cáo hoặc kiểm tra
-            print("=== [RECOMMENDER DEBUG] ===")
-            print(f"[1] User: {user.username} - Qualification: {user.qualification}")
-            print(f"[2] Student Interested Categories: {student.interesting_cate}")
-            print(f"[3] Product ID input: {product_id}")
-            print(f"[4] Purchased: {list(purchased_ids)}")
-            print(f"[5] Rated: {list(rated_ids)}")
-            print(f"[6] Commented: {list(commented_ids)}")
-            print(f"[7] Interacted Course IDs: {list(interacted_ids)}")
-            print(f"[8] TF-IDF Recommended IDs: {recommended_ids_by_tfidf[:10]}")
-            print(f"[9] Final Recommended IDs: {recommended_ids}")
-            print("============================")
+            logger.debug('Recommend student=%s product=%s interacted=%s ranked=%s final=%s', student.id, product_id,
+                         sorted(interacted_ids), recommended_ids_by_score[:10], recommended_ids)
 
             # === [6] Serialize và trả về
             queryset = Course.objects.filter(id__in=recommended_ids)
             serializer = self.get_serializer(queryset, many=True)
+            recommender.cache_recommendations(student.id, product_id, serializer.data, version)
             return Response(serializer.data)
 
         except Exception as e:
             return Response({'error': 'Đã xảy ra lỗi: ' + str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(methods=['post'], detail=False, permission_classes=[permissions.IsAuthenticated])
+    def batch_recommend(self, request):
+        # Gợi ý cho nhiều khóa học cùng lúc (vd: các thẻ khóa học trên 1 trang).
+        # product_ids rỗng -> gợi ý "dành cho bạn" từ các khóa học đã tương tác
+        user = request.user
+        if not hasattr(user, 'student'):
+            return Response({'error': 'Người dùng không phải là học viên'}, status=status.HTTP_400_BAD_REQUEST)
+        student = user.student
+
+        product_ids = request.data.get('product_ids') or []
+        limit = request.data.get('limit', 10)
+        if not isinstance(product_ids, list) or not all(str(p).isdigit() for p in product_ids) \
+                or not str(limit).isdigit():
+            return Response({'error': 'product_ids hoặc limit không hợp lệ'}, status=status.HTTP_400_BAD_REQUEST)
+        seed_ids = sorted({int(p) for p in product_ids})
+        if len(seed_ids) > settings.RECOMMENDER_BATCH_MAX_SEEDS:
+            return Response({'error': f'Tối đa {settings.RECOMMENDER_BATCH_MAX_SEEDS} khóa học'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = min(int(limit), settings.RECOMMENDER_TOP_K)
+
+        cache_key = ('batch', tuple(seed_ids), limit)
+        version = recommender.model_version(student.id)
+        cached = recommender.get_cached_recommendations(student.id, cache_key, version)
+        if cached is not None:
+            return Response(cached)
+
+        # 1 truy vấn lấy tất cả khóa học đã tương tác, dùng chung cho mọi seed
+        interacted_ids = recommender.interacted_course_ids(student)
+        if seed_ids:
+            recommended_ids = recommender.ranked_for_seeds(seed_ids, interacted_ids, limit)
+        elif interacted_ids:
+            # Các khóa học tương tác gần nhất làm seed
+            recommended_ids = recommender.ranked_for_seeds(
+                interacted_ids[:settings.RECOMMENDER_BATCH_MAX_SEEDS], interacted_ids, limit)
+        else:
+            recommended_ids = coldstart.ranker.recommend(student.interesting_cate, user.qualification, limit)
+
+        # Giữ thứ tự theo điểm
+        courses = Course.objects.select_related('category').prefetch_related('chapters').in_bulk(recommended_ids)
+        serializer = self.get_serializer([courses[i] for i in recommended_ids if i in courses], many=True)
+        recommender.cache_recommendations(student.id, cache_key, serializer.data, version)
+        return Response(serializer.data)
+
 
 class CourseExamViewSet(viewsets.GenericViewSet):
     serializer_class = serializers.ExamSerializer
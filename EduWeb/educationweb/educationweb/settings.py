@@ -208,4 +208,27 @@ EMAIL_HOST_USER = 'thanhngan.220803@gmail.com'
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 
 VERIFY_EMAIL_URL = 'users-activate'
-FRONTEND_BASE_URL = os.getenv('FRONTEND_BASE_URL', 'http://localhost:3000')
\ No newline at end of file
+FRONTEND_BASE_URL = os.getenv('FRONTEND_BASE_URL', 'http://localhost:3000')
+# Số khóa học tương đồng giữ lại cho mỗi khóa học trong recommender
+RECOMMENDER_TOP_K = 50
+# Chu kỳ (giây) mỗi worker kiểm tra thay đổi khóa học để cập nhật recommender
+RECOMMENDER_SYNC_INTERVAL = 5
+# None: tính top-k chính xác (O(N^2), phù hợp danh mục nhỏ).
+# Với danh mục lớn dùng approximate (LSH), vd: {'tables': 8, 'bits': 16, 'block': 512, 'seed': 0}
+# tăng tables/block để recall cao hơn, đổi lại build chậm hơn (xem: manage.py bench_similarity --ann)
+RECOMMENDER_ANN = None
+# Trọng số của collaborative filtering khi trộn với điểm TF-IDF (0 -> chỉ dùng TF-IDF)
+RECOMMENDER_CF_WEIGHT = 0.5
+# Chu kỳ (giây) kiểm tra và tính lại collaborative filtering ở nền
+RECOMMENDER_CF_REFRESH_INTERVAL = 300
+# Số khóa học gốc tối đa cho 1 lần gợi ý hàng loạt (recommend/batch_recommend/)
+RECOMMENDER_BATCH_MAX_SEEDS = 50
+# Backend tìm kiếm khóa học: index trong bộ nhớ (mọi database) hoặc FULLTEXT của MySQL
+# 'courses.search.MySQLFulltextBackend' (cần ngram_token_size=3 trong my.cnf trước khi chạy migration 0031,
+# kiểm tra ở lần tìm đầu tiên)
+COURSE_SEARCH_BACKEND = 'courses.search.InvertedIndexBackend'
+# Index tiền tố cho gợi ý khi gõ (courses/autocomplete): Redis sorted set dùng chung cho mọi worker,
+# 'courses.autocomplete.MemoryPrefixIndex' khi không có Redis
+COURSE_AUTOCOMPLETE_BACKEND = 'courses.autocomplete.RedisPrefixIndex'
+# Thư mục chứa artifact của recommender (tạo bằng: python manage.py build_recommender)
+RECOMMENDER_ARTIFACTS_DIR = os.path.join(BASE_DIR, 'recommender_artifacts')
@@ -0,0 +1,26 @@
+# Cấu hình chạy benchmark/đánh giá offline: SQLite + cache trong bộ nhớ, không cần MySQL/Redis
+# python manage.py evaluate_recommender --settings=educationweb.settings_bench
+import tempfile
+
+from .settings import *
+
+# File DB riêng cho benchmark: các lệnh xóa/sinh dữ liệu giả lập (evaluate_recommender, bench_export)
+# từ chối chạy trên DB khác
+BENCH_DATABASE = os.path.join(tempfile.gettempdir(), 'educationweb_bench.sqlite3')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BENCH_DATABASE,
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+COURSE_AUTOCOMPLETE_BACKEND = 'courses.autocomplete.MemoryPrefixIndex'
+
+RECOMMENDER_ARTIFACTS_DIR = os.path.join(tempfile.gettempdir(), 'educationweb_bench_artifacts')